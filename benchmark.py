@@ -0,0 +1,68 @@
+"""Compare execution backends on a pair of exports.
+
+    python benchmark.py fanout.csv gsc.csv --repeat 3
+
+Times pipeline.build_analysis() per backend (best of --repeat) with a per-stage
+breakdown, and checks every backend's matched table against the pandas one.
+"""
+import argparse
+import time
+
+import pandas as pd
+
+import pipeline
+
+
+def timed_run(fanout_bytes, gsc_bytes, backend, cluster_threshold):
+    stages = {}
+    marks = []
+
+    def progress(stage, fraction):
+        if not marks or marks[-1][0] != stage:
+            marks.append((stage, time.perf_counter()))
+
+    start = time.perf_counter()
+    result = pipeline.build_analysis(fanout_bytes, gsc_bytes, cluster_threshold, progress=progress, backend=backend)
+    end = time.perf_counter()
+    for (stage, began), (_, finished) in zip(marks, marks[1:] + [(None, end)]):
+        stages[stage] = stages.get(stage, 0.0) + finished - began
+    return end - start, stages, result
+
+
+def compare(reference, result):
+    try:
+        pd.testing.assert_frame_equal(reference['matched'], result['matched'])
+        pd.testing.assert_frame_equal(reference['cube'], result['cube'], check_exact=False)
+    except AssertionError as exc:
+        return f'DIFFERENT: {str(exc).splitlines()[0]}'
+    return 'identical'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the pandas and polars backends')
+    parser.add_argument('fanout')
+    parser.add_argument('gsc')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--cluster', type=float, default=None)
+    parser.add_argument('--backends', nargs='+', default=list(pipeline.BACKENDS))
+    args = parser.parse_args(argv)
+
+    with open(args.fanout, 'rb') as f:
+        fanout_bytes = f.read()
+    with open(args.gsc, 'rb') as f:
+        gsc_bytes = f.read()
+
+    reference = None
+    print(f"{'backend':<10}{'best s':>9}{'ingest':>9}{'match':>9}{'aggregate':>11}{'payload':>9}  output")
+    for backend in args.backends:
+        runs = [timed_run(fanout_bytes, gsc_bytes, backend, args.cluster) for _ in range(args.repeat)]
+        seconds, stages, result = min(runs, key=lambda run: run[0])
+        if reference is None:
+            reference = result
+        check = 'reference' if result is reference else compare(reference, result)
+        print(f"{backend:<10}{seconds:>9.3f}{stages.get('ingest', 0):>9.3f}{stages.get('match', 0):>9.3f}"
+              f"{stages.get('aggregate', 0):>11.3f}{stages.get('payload', 0):>9.3f}  {check}")
+
+
+if __name__ == '__main__':
+    main()
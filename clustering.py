@@ -0,0 +1,108 @@
+import math
+from collections import Counter, defaultdict
+
+from matching import MIN_WORD_LENGTH, normalize
+
+DEFAULT_THRESHOLD = 0.6
+
+
+def tokenize(query):
+    words = normalize(query).split()
+    tokens = {w for w in words if len(w) >= MIN_WORD_LENGTH}
+    # Very short queries ("vs ai") would otherwise have no tokens at all
+    return frozenset(tokens or words)
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter)
+
+
+def _prefix_length(size, threshold):
+    # Two sets with Jaccard >= threshold must share a token within these prefixes
+    return size - math.ceil(threshold * size) + 1
+
+
+def cluster_queries(matched_df, threshold=DEFAULT_THRESHOLD):
+    """Group near-paraphrase fan-out queries into clusters.
+
+    Clustering runs within each (type, routing_format) block so every cluster maps
+    to one column of the type and format heatmaps. Rows are visited strongest
+    first (ranking, then impressions) and each joins the first existing leader
+    it is similar enough to, so the leader doubles as the representative.
+    Candidate leaders come from a prefix-filtered token index instead of
+    comparing all pairs.
+    """
+    rows = matched_df.to_dict('records')
+    token_sets = [tokenize(row['fanout_query']) for row in rows]
+
+    # Rare tokens first, so prefixes are short and postings stay small
+    doc_freq = Counter(token for tokens in token_sets for token in tokens)
+
+    def ordered(tokens):
+        return sorted(tokens, key=lambda t: (doc_freq[t], t))
+
+    blocks = defaultdict(list)
+    for idx, row in enumerate(rows):
+        blocks[(row['type'], row['routing_format'])].append(idx)
+
+    clusters = []
+    for members in blocks.values():
+        members.sort(key=lambda i: (
+            rows[i]['is_gap'],
+            -(rows[i]['impressions'] or 0),
+            rows[i]['position'] if rows[i]['position'] == rows[i]['position'] else math.inf,
+            i,
+        ))
+        leaders = []
+        leader_members = []
+        index = defaultdict(list)
+        for idx in members:
+            tokens = ordered(token_sets[idx])
+            prefix = tokens[:_prefix_length(len(tokens), threshold)]
+            assigned = None
+            seen = set()
+            for token in prefix:
+                for leader in index[token]:
+                    if leader in seen:
+                        continue
+                    seen.add(leader)
+                    if jaccard(token_sets[idx], token_sets[leaders[leader]]) >= threshold:
+                        if assigned is None or leader < assigned:
+                            assigned = leader
+            if assigned is None:
+                assigned = len(leaders)
+                leaders.append(idx)
+                leader_members.append([])
+                for token in prefix:
+                    index[token].append(assigned)
+            leader_members[assigned].append(idx)
+
+        for leader, cluster in zip(leaders, leader_members):
+            clusters.append(_summarize(rows, leader, sorted(cluster)))
+
+    # Keep fan-out order: a cluster sits where its earliest member appeared
+    clusters.sort(key=lambda c: c['members'][0])
+    return clusters
+
+
+def _summarize(rows, representative, members):
+    positions = sorted(
+        rows[i]['position'] for i in members
+        if not rows[i]['is_gap'] and rows[i]['position'] == rows[i]['position']
+    )
+    median = None
+    if positions:
+        mid = len(positions) // 2
+        median = positions[mid] if len(positions) % 2 else (positions[mid - 1] + positions[mid]) / 2
+    return {
+        'representative': representative,
+        'members': members,
+        'best_position': positions[0] if positions else None,
+        'median_position': median,
+        'clicks': sum(rows[i]['clicks'] or 0 for i in members),
+        'impressions': sum(rows[i]['impressions'] or 0 for i in members),
+        'gap_count': sum(1 for i in members if rows[i]['is_gap']),
+    }
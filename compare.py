@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+from matching import GscIndex, normalize
+
+# Per-row change labels, in the order the page lists them
+CHANGES = ['gained', 'improved', 'unchanged', 'declined', 'lost', 'not ranking', 'not evaluated']
+COMPARE_COLUMNS = ['previous_position', 'position_delta', 'change']
+
+
+def _normalized(series):
+    # matching.normalize() over a whole column: missing -> '', then lower() and strip()
+    return series.where(series.notna(), '').astype(str).str.lower().str.strip()
+
+
+def _positions(gsc_df):
+    # One row per normalized query; the earliest row wins, as in the exact-match table
+    frame = pd.DataFrame({
+        'key': _normalized(gsc_df['Top queries']),
+        'previous_position': pd.to_numeric(gsc_df['Position'], errors='coerce'),
+        'found': True,
+    })
+    return frame.drop_duplicates('key')
+
+
+def compare_positions(matched_df, previous_gsc_df, previous_index=None):
+    """previous_position, position_delta and change for each matched fan-out row.
+
+    The fan-out set is matched once, against the current export. Rows that rank
+    keep their matched GSC query, and the previous export is merge-joined onto
+    those queries in one pass. Only rows the merge leaves unmatched (gaps now, or
+    matched to a query the old export doesn't have) go through the matcher
+    again, against the previous export.
+
+    A row ranks in an export when it matches one of its queries, even if that
+    row's Position is blank; the delta is then unknown (NaN), not a change.
+    position_delta is previous minus current, so a positive delta moved up.
+    """
+    if 'evaluated' in matched_df:
+        evaluated = matched_df['evaluated'].astype(bool).to_numpy()
+    else:
+        evaluated = np.ones(len(matched_df), dtype=bool)
+    position = matched_df['position'].astype(float).to_numpy()
+    ranking = ~matched_df['is_gap'].astype(bool).to_numpy() & evaluated
+
+    keys = pd.DataFrame({'key': _normalized(matched_df['matched_gsc_query'])})
+    merged = keys.merge(_positions(previous_gsc_df), on='key', how='left')
+    was_ranking = ranking & merged['found'].notna().to_numpy()
+    previous = np.where(was_ranking, merged['previous_position'].to_numpy(dtype=float), np.nan)
+
+    missed = evaluated & ~was_ranking
+    if missed.any():
+        previous_index = previous_index or GscIndex(previous_gsc_df)
+        rows = np.flatnonzero(missed)
+        queries = [normalize(q) for q in matched_df['fanout_query'].to_numpy()[rows]]
+        found = previous_index.best_matches(queries)
+        hit = found >= 0
+        positions = pd.to_numeric(previous_gsc_df['Position'], errors='coerce').to_numpy(dtype=float)
+        was_ranking[rows[hit]] = True
+        previous[rows[hit]] = positions[found[hit]]
+
+    delta = np.round(previous - position, 1)
+    change = np.select(
+        [~evaluated,
+         ranking & ~was_ranking,
+         ~ranking & was_ranking,
+         ranking & (delta > 0),
+         ranking & (delta < 0),
+         ranking],
+        ['not evaluated', 'gained', 'lost', 'improved', 'declined', 'unchanged'],
+        default='not ranking',
+    )
+    return pd.DataFrame({
+        'previous_position': previous,
+        'position_delta': np.where(ranking & was_ranking, delta, np.nan),
+        'change': change,
+    }, index=matched_df.index)
+
+
+def change_counts(changes):
+    counts = changes['change'].value_counts()
+    return {label: int(counts.get(label, 0)) for label in CHANGES}
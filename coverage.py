@@ -0,0 +1,73 @@
+from collections import Counter, defaultdict
+
+from matching import MIN_WORD_LENGTH, normalize
+
+TOP_MISSING = 15
+
+
+def _terms(query):
+    tokens = normalize(query).split()
+    bigrams = [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+    return tokens, bigrams
+
+
+class CoverageIndex:
+    """Impression-weighted document frequency of every token and bigram in a GSC export.
+
+    Built in a single pass over the export; lookups are dictionary hits, so
+    checking a fan-out query costs O(its token count) regardless of export size.
+    """
+
+    def __init__(self, gsc_df):
+        self.terms = Counter()
+        queries = gsc_df['Top queries'].tolist() if 'Top queries' in gsc_df else []
+        if 'Impressions' in gsc_df:
+            weights = gsc_df['Impressions'].fillna(0).tolist()
+        else:
+            weights = [1] * len(queries)
+        for query, weight in zip(queries, weights):
+            tokens, bigrams = _terms(query)
+            # Weight each distinct term once per GSC query; zero-impression rows still register the term
+            for term in set(tokens).union(bigrams):
+                self.terms[term] += weight
+
+    def weight(self, term):
+        return self.terms.get(term, 0)
+
+    def missing(self, query):
+        # Terms of the query that no GSC query contains. Short words are skipped,
+        # as in matching; a bigram counts only when both its words are present
+        # on their own, otherwise the missing word already explains it.
+        tokens, bigrams = _terms(query)
+        missing_tokens = [t for t in dict.fromkeys(tokens) if len(t) >= MIN_WORD_LENGTH and t not in self.terms]
+        missing_bigrams = [
+            b for b in dict.fromkeys(bigrams)
+            if b not in self.terms and all(t in self.terms for t in b.split(' '))
+        ]
+        return missing_tokens + missing_bigrams
+
+
+def missing_terms(matched_df, index):
+    return [index.missing(query) for query in matched_df['fanout_query'].tolist()]
+
+
+def summarize(matched_df, missing):
+    # Per type and per routing format: how many queries hit an unseen term, and which terms
+    summary = {}
+    for dimension in ('type', 'routing_format'):
+        groups = defaultdict(lambda: {'queries': 0, 'with_missing': 0, 'terms': Counter()})
+        for key, terms in zip(matched_df[dimension].tolist(), missing):
+            group = groups[key if isinstance(key, str) else '']
+            group['queries'] += 1
+            if terms:
+                group['with_missing'] += 1
+                group['terms'].update(terms)
+        summary[dimension] = {
+            key: {
+                'queries': group['queries'],
+                'with_missing': group['with_missing'],
+                'missing': group['terms'].most_common(TOP_MISSING),
+            }
+            for key, group in sorted(groups.items())
+        }
+    return summary
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = ['type', 'user_intent', 'routing_format', 'bucket']
+MEASURES = ['count', 'ranking', 'gaps', 'clicks', 'impressions', 'position_sum']
+
+# Position buckets, right-inclusive: (0, 3], (3, 10], ... so "1-3" is exactly the page's "Top 3"
+BUCKET_EDGES = [3, 10, 20, 50]
+BUCKET_LABELS = ['1-3', '3-10', '10-20', '20-50', '50+']
+GAP_BUCKET = 'gap'
+# Rows a matching time budget never scored (matched tables with an `evaluated` column)
+NOT_EVALUATED_BUCKET = 'not evaluated'
+
+
+def position_bucket(matched_df):
+    # (bucket label, is gap, is ranking) per row; not-evaluated rows are neither
+    position = matched_df['position'].astype(float).to_numpy()
+    gap = matched_df['is_gap'].astype(bool).to_numpy() | np.isnan(position)
+    labels = np.array(BUCKET_LABELS + [GAP_BUCKET, NOT_EVALUATED_BUCKET], dtype=object)
+    index = np.searchsorted(BUCKET_EDGES, np.nan_to_num(position), side='left')
+    index[gap] = len(BUCKET_LABELS)
+    if 'evaluated' in matched_df:
+        pending = ~matched_df['evaluated'].astype(bool).to_numpy()
+        index[pending] = len(BUCKET_LABELS) + 1
+        gap &= ~pending
+    return labels[index], gap, index < len(BUCKET_LABELS)
+
+
+def build_cube(matched_df):
+    """Pre-aggregated type x user_intent x routing_format x position bucket cube.
+
+    One row per non-empty cell with additive measures only (counts and sums),
+    so any slice or roll-up is a sum over cube rows. Labels keep their order of
+    first appearance in the matched table, as the page's per-type listings do.
+    """
+    bucket, gap, ranking = position_bucket(matched_df)
+    rows = pd.DataFrame({
+        'type': matched_df['type'],
+        'user_intent': matched_df['user_intent'],
+        'routing_format': matched_df['routing_format'],
+        'bucket': bucket,
+        'count': 1,
+        'ranking': ranking,
+        'gaps': gap,
+        'clicks': matched_df['clicks'].fillna(0),
+        'impressions': matched_df['impressions'].fillna(0),
+        'position_sum': np.where(ranking, matched_df['position'].astype(float).fillna(0.0), 0.0),
+    })
+    cube = rows.groupby(DIMENSIONS, sort=False, dropna=False).sum().reset_index()
+    return cube.astype({'ranking': int, 'gaps': int})
+
+
+def slice_cube(cube, rows, columns=None, measure='count', filters=None):
+    """Pivot of one measure over one or two dimensions, from the cube alone.
+
+    `filters` maps a dimension to the labels to keep. `measure` may also be
+    "avg_position" (position_sum / ranking, NaN where nothing ranks); empty
+    cells of the additive measures are 0. Buckets come in position order.
+    """
+    for dimension in [rows, *filter(None, [columns]), *(filters or {})]:
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension {dimension!r}; expected one of {', '.join(DIMENSIONS)}")
+    if measure != 'avg_position' and measure not in MEASURES:
+        raise ValueError(f"Unknown measure {measure!r}")
+    for dimension, labels in (filters or {}).items():
+        cube = cube[cube[dimension].isin(labels)]
+
+    keys = [rows] + ([columns] if columns else [])
+    sums = cube.groupby(keys, sort=False, dropna=False)[MEASURES].sum()
+    if measure == 'avg_position':
+        values = sums['position_sum'] / sums['ranking'].replace(0, np.nan)
+    else:
+        values = sums[measure]
+    if columns:
+        values = values.unstack(columns, fill_value=np.nan if measure == 'avg_position' else 0)
+        if columns == 'bucket':
+            values = values.reindex(columns=_bucket_order(values.columns))
+    if rows == 'bucket':
+        values = values.reindex(_bucket_order(values.index))
+    return values
+
+
+def _bucket_order(labels):
+    order = BUCKET_LABELS + [GAP_BUCKET, NOT_EVALUATED_BUCKET]
+    return [b for b in order if b in set(labels)]
+
+
+def slice_records(records, rows, columns=None, measure='count', filters=None):
+    """slice_cube() over cube rows as JSON records (the API's cube); returns a JSON-ready dict."""
+    if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+        raise ValueError('"cube" must be a list of cube rows')
+    if filters is not None and (not isinstance(filters, dict)
+                                or not all(isinstance(labels, list) for labels in filters.values())):
+        raise ValueError('"filters" must map dimensions to lists of labels')
+    cube = pd.DataFrame.from_records(records, columns=DIMENSIONS + MEASURES)
+    values = slice_cube(cube, rows, columns, measure, filters)
+    # NaN (no ranking rows for avg_position) becomes null
+    cells = values.astype(object).where(values.notna(), None)
+    return {
+        'rows': values.index.tolist(),
+        'columns': values.columns.tolist() if columns else None,
+        'values': cells.values.tolist(),
+    }
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+# Histogram bin edges per traced metric; the last bin is open-ended
+BINS = {
+    'candidates': [0, 1, 2, 5, 10, 25, 50, 100, 250, 1000],
+    'scored': [0, 1, 2, 3, 5, 10, 25],
+    'best_score': [0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100],
+    'ms': [0, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+}
+SLOWEST = 20
+
+
+def histogram(values, edges):
+    """Counts per [edge, next edge) bin, labelled for display; missing values are their own bin."""
+    values = pd.Series(values, dtype=float)
+    labels = [f'{lo:g}-{hi:g}' for lo, hi in zip(edges, edges[1:])] + [f'{edges[-1]:g}+']
+    counts = np.bincount(
+        np.searchsorted(edges, values.dropna().to_numpy(), side='right') - 1,
+        minlength=len(labels),
+    )[:len(labels)]
+    table = pd.DataFrame({'bin': labels, 'rows': counts})
+    missing = int(values.isna().sum())
+    if missing:
+        table.loc[len(table)] = ['none', missing]
+    return table.set_index('bin')
+
+
+def histograms(diagnostics_df):
+    return {metric: histogram(diagnostics_df[metric], edges) for metric, edges in BINS.items()}
+
+
+def summary(diagnostics_df):
+    ms = diagnostics_df['ms']
+    return {
+        'rows': len(diagnostics_df),
+        'total_ms': float(ms.sum()),
+        'p95_ms': float(ms.quantile(0.95)) if len(ms) else 0.0,
+        'mean_candidates': float(diagnostics_df['candidates'].mean()) if len(ms) else 0.0,
+        'no_candidates': int((diagnostics_df['candidates'] == 0).sum()),
+    }
+
+
+def slowest(matched_df, diagnostics_df, n=SLOWEST):
+    table = diagnostics_df.assign(fanout_query=matched_df['fanout_query'])
+    return table.nlargest(n, 'ms')[['fanout_query'] + list(diagnostics_df.columns)]
+
+
+def near_misses(matched_df, diagnostics_df, n=SLOWEST):
+    # Content gaps whose closest GSC query scored highest: candidates for tuning the match rules
+    table = diagnostics_df.assign(fanout_query=matched_df['fanout_query'])[matched_df['is_gap'].astype(bool)]
+    return table.nlargest(n, 'best_score')[['fanout_query', 'best_score', 'best_gsc_query', 'candidates']]
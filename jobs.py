@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, key):
+        self.key = key
+        self.status = QUEUED
+        self.stage = None
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stage_durations = {}
+        self.watchers = set()
+        self.future = None
+        self._cancel = threading.Event()
+        self._stage_started = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def duration(self):
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+    def report(self, stage, fraction):
+        # Progress callback handed to the pipeline; also the cancellation point
+        if self._cancel.is_set():
+            raise JobCancelled(self.key)
+        now = time.time()
+        if stage != self.stage:
+            self._close_stage(now)
+            self.stage = stage
+            self._stage_started = now
+        self.progress = max(0.0, min(1.0, fraction))
+
+    def _close_stage(self, now):
+        if self.stage is not None:
+            self.stage_durations[self.stage] = now - self._stage_started
+
+
+class JobQueue:
+    """Bounded worker pool for analysis jobs keyed by input hash.
+
+    Submitting a key that is already queued, running or recently finished returns
+    the existing job, so sessions uploading the same files share one run. A job
+    is cancelled once no session is watching it any more. Failed jobs are kept
+    like finished ones, so resubmitting the same inputs shows the error instead
+    of running again; they are dropped once their last watcher moves on, and only
+    cancelled jobs are restarted by a resubmit.
+    """
+
+    def __init__(self, max_workers=2, keep_finished=16, history=200):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis')
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._keep_finished = keep_finished
+        self._history = deque(maxlen=history)
+
+    def submit(self, key, watcher, fn, *args, **kwargs):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job.status == CANCELLED:
+                job = Job(key)
+                self._jobs[key] = job
+                job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+            self._jobs.move_to_end(key)
+            job.watchers.add(watcher)
+            self._evict()
+            return job
+
+    def release(self, key, watcher):
+        # Called when a session moves on to different inputs
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                return
+            job.watchers.discard(watcher)
+            if job.watchers:
+                return
+            if not job.finished:
+                self._cancel(job)
+            elif job.status == FAILED:
+                # Nobody is looking at the error any more: the next submit retries
+                del self._jobs[key]
+
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def _cancel(self, job):
+        job._cancel.set()
+        if job.future.cancel():
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            self._history.append(job)
+
+    def _run(self, job, fn, args, kwargs):
+        if job._cancel.is_set():
+            # Cancelled after the worker picked it up, before it started
+            with self._lock:
+                job.status = CANCELLED
+                job.finished_at = time.time()
+                self._history.append(job)
+                self._evict()
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = fn(*args, progress=job.report, **kwargs)
+            job.status = DONE
+            job.progress = 1.0
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as exc:
+            job.error = exc
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            job._close_stage(job.finished_at)
+            with self._lock:
+                self._history.append(job)
+                self._evict()
+
+    def _evict(self):
+        finished = [key for key, job in self._jobs.items() if job.finished]
+        for key in finished[:max(0, len(finished) - self._keep_finished)]:
+            del self._jobs[key]
+
+    def stats(self):
+        # Snapshot for capacity planning: queue depth, running jobs and recent durations
+        with self._lock:
+            jobs = list(self._jobs.values())
+            history = list(self._history)
+        durations = sorted(job.duration for job in history if job.status == DONE)
+        stage_totals = {}
+        for job in history:
+            for stage, seconds in job.stage_durations.items():
+                stage_totals.setdefault(stage, []).append(seconds)
+        return {
+            'workers': self.max_workers,
+            'queued': sum(job.status == QUEUED for job in jobs),
+            'running': sum(job.status == RUNNING for job in jobs),
+            'completed': sum(job.status == DONE for job in history),
+            'failed': sum(job.status == FAILED for job in history),
+            'cancelled': sum(job.status == CANCELLED for job in history),
+            'duration_mean': sum(durations) / len(durations) if durations else None,
+            'duration_p95': durations[int(0.95 * (len(durations) - 1))] if durations else None,
+            'stage_mean': {stage: sum(v) / len(v) for stage, v in stage_totals.items()},
+            'recent': [
+                {
+                    'key': job.key[:12],
+                    'status': job.status,
+                    'queued_s': round((job.started_at or job.finished_at or time.time()) - job.submitted_at, 2),
+                    'run_s': round(job.duration, 2) if job.duration is not None else None,
+                }
+                for job in reversed(history[-10:])
+            ],
+        }
@@ -0,0 +1,319 @@
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Match rules, kept identical to the original in-browser matcher
+MIN_WORD_LENGTH = 3
+MIN_SIMILARITY = 0.7
+MAX_LENGTH_DIFF = 20
+EXACT_SCORE = 100
+FUZZY_WEIGHT = 90
+MIN_SCORE = 50
+
+# Upper bound on candidate pairs scored per sparse block; bounds memory of the batched scorer
+MAX_BLOCK_PAIRS = 4_000_000
+# Upper bound on fan-out rows per block; progress (and so cancellation) is reported at least this often
+MAX_BLOCK_ROWS = 500
+# best_matches() marker for rows a time budget ran out before scoring
+NOT_EVALUATED = -2
+# Fuzzy matching order under a time budget: types closest to the seed query first,
+# shorter queries first within a type; unlisted types go last
+TYPE_PRIORITY = ['reformulation', 'related', 'implicit', 'comparative', 'entity_expansion', 'personalized']
+
+MATCHED_COLUMNS = [
+    'fanout_query', 'type', 'user_intent', 'routing_format', 'position',
+    'clicks', 'impressions', 'ctr', 'matched_gsc_query', 'is_gap',
+]
+
+# Per-row trace fields recorded when match_queries() is given a diagnostics list. They come
+# from the same sparse scorer as the match itself; `ms` is the row's share of its block's
+# scoring time, split by candidate pairs.
+DIAGNOSTIC_COLUMNS = [
+    'candidates', 'scored', 'best_score', 'best_gsc_query',
+    'runner_up_score', 'runner_up_gsc_query', 'ms',
+]
+
+
+def normalize(query):
+    if query is None or (isinstance(query, float) and query != query):
+        return ''
+    return str(query).lower().strip()
+
+
+def _int(value):
+    # Clicks/impressions: blank or unparseable cells count as 0 so the page can always format them
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class GscIndex:
+    """Exact-match table and word postings over the GSC queries.
+
+    A fuzzy match needs at least one shared word of MIN_WORD_LENGTH+ characters,
+    so only GSC rows sharing such a word with the fan-out query are scored.
+    """
+
+    def __init__(self, gsc_df):
+        self.rows = gsc_df.to_dict('records')
+        self.queries = [normalize(row.get('Top queries')) for row in self.rows]
+        self.word_counts = [len(q.split(' ')) for q in self.queries]
+        self.exact = {}
+        self.postings = defaultdict(list)
+        for idx, query in enumerate(self.queries):
+            self.exact.setdefault(query, idx)
+            for word in set(query.split(' ')):
+                if len(word) >= MIN_WORD_LENGTH:
+                    self.postings[word].append(idx)
+        # Built up front: one index is shared by concurrent runs (server.IndexCache)
+        self._build_incidence()
+
+    def _build_incidence(self):
+        # GSC x vocabulary binary matrix, straight from the postings
+        self._vocab = {word: i for i, word in enumerate(self.postings)}
+        lengths = np.fromiter((len(rows) for rows in self.postings.values()), dtype=np.int64,
+                              count=len(self.postings))
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        indices = np.fromiter((idx for rows in self.postings.values() for idx in rows), dtype=np.int32,
+                              count=int(indptr[-1]))
+        # CSC over (gsc row, word); its transpose is the (word, gsc row) CSR the product needs
+        gsc_words = sparse.csc_matrix((np.ones(len(indices)), indices, indptr),
+                                      shape=(len(self.queries), len(self._vocab)))
+        self._gsc_words_t = gsc_words.T.tocsr()
+        self._posting_lengths = lengths.astype(np.float64)
+        self._word_counts = np.asarray(self.word_counts, dtype=np.int64)
+        self._lengths = np.fromiter((len(q) for q in self.queries), dtype=np.int64, count=len(self.queries))
+
+    def best_matches(self, fanout_queries, progress=None, order=None, deadline=None, trace=None):
+        """Best GSC row index for many normalized queries at once (-1 for gaps).
+
+        Exact matches score EXACT_SCORE and take the earliest GSC row with the
+        same query. Otherwise shared-word counts for every fan-out/GSC pair come
+        from one sparse product per block of rows (fan-out word counts x GSC word
+        incidence), then the similarity, length and score rules and the
+        earliest-row tie-break are applied to the non-zero pairs as array operations.
+
+        Exact matches are resolved for every row up front. Fuzzy blocks then follow
+        `order` (row indices, default input order) and stop once time.perf_counter()
+        passes `deadline`; rows left unscored come back as NOT_EVALUATED.
+
+        Pass a dict as `trace` to have it filled with per-row candidate arrays
+        (see trace_records()); exact matches are then scored as well, for the trace.
+        """
+        if progress is not None:
+            progress('match', 0.0)
+        vocab = self._vocab
+        n = len(fanout_queries)
+        best = np.full(n, -1, dtype=np.int64)
+        exact = np.full(n, -1, dtype=np.int64)
+        rows, cols = [], []
+        fanout_words = np.zeros(n, dtype=np.int64)
+        fanout_lengths = np.zeros(n, dtype=np.int64)
+        for i, query in enumerate(fanout_queries):
+            idx = self.exact.get(query)
+            if idx is not None:
+                exact[i] = idx
+                if trace is None:
+                    continue
+            words = query.split(' ')
+            fanout_words[i] = len(words)
+            fanout_lengths[i] = len(query)
+            for word in words:
+                col = vocab.get(word) if len(word) >= MIN_WORD_LENGTH else None
+                if col is not None:
+                    rows.append(i)
+                    cols.append(col)
+        # Duplicate (row, word) entries sum, so repeated fan-out words count once per repeat
+        counts = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, len(vocab)))
+        counts.sum_duplicates()
+        if trace is not None:
+            trace.update(
+                exact=exact,
+                reached=np.ones(n, dtype=bool),
+                candidates=np.zeros(n, dtype=np.int64),
+                scored=np.zeros(n, dtype=np.int64),
+                top_score=np.full(n, np.nan), top_idx=np.full(n, -1, dtype=np.int64),
+                second_score=np.full(n, np.nan), second_idx=np.full(n, -1, dtype=np.int64),
+                ms=np.zeros(n),
+            )
+
+        # Worst-case pairs per row (its words' posting lengths). Rows without any are
+        # exact matches or certain gaps; the rest are scored in blocks cut on the running total.
+        row_pairs = counts @ self._posting_lengths
+        pending = np.arange(n) if order is None else np.asarray(order, dtype=np.int64)
+        pending = pending[row_pairs[pending] > 0]
+        # Exact matches are only scored for the trace: after every row that needs it
+        pending = np.concatenate([pending[exact[pending] < 0], pending[exact[pending] >= 0]])
+        best[pending] = NOT_EVALUATED
+        counts = counts[pending]
+        pair_bounds = np.cumsum(row_pairs[pending])
+        start = 0
+        while start < len(pending):
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            done = pair_bounds[start - 1] if start else 0.0
+            stop = max(start + 1, int(np.searchsorted(pair_bounds, done + MAX_BLOCK_PAIRS, side='right')))
+            stop = min(stop, start + MAX_BLOCK_ROWS, len(pending))
+            if progress is not None:
+                progress('match', start / len(pending))
+            block = pending[start:stop]
+            best[block] = -1
+            began = time.perf_counter()
+            shared = self._score_block(counts[start:stop], block, fanout_words, fanout_lengths, best)
+            if trace is not None:
+                self._trace_block(shared, block, fanout_words, trace, time.perf_counter() - began)
+            start = stop
+        if trace is not None:
+            trace['reached'][pending[start:]] = False
+        best[exact >= 0] = exact[exact >= 0]
+        return best
+
+    def _score_block(self, counts, block, fanout_words, fanout_lengths, best):
+        # `block` holds the fan-out row index of each row of `counts`; returns the shared-word counts
+        shared = (counts @ self._gsc_words_t).tocsr()
+        row = np.repeat(block, np.diff(shared.indptr))
+        # Cheap superset filter first: similarity > MIN_SIMILARITY needs more shared words than
+        # MIN_SIMILARITY x the fan-out word count. The exact rules below decide.
+        keep = shared.data > MIN_SIMILARITY * fanout_words[row] - 1e-9
+        row, col, shared_words = row[keep], shared.indices[keep], shared.data[keep]
+        similarity = shared_words / np.maximum(fanout_words[row], self._word_counts[col])
+        score = similarity * FUZZY_WEIGHT
+        keep = ((similarity > MIN_SIMILARITY)
+                & (np.abs(fanout_lengths[row] - self._lengths[col]) < MAX_LENGTH_DIFF)
+                & (score > MIN_SCORE))
+        row, col, score = row[keep], col[keep], score[keep]
+        if len(row):
+            # Per row: highest score, ties to the earliest GSC row
+            order = np.lexsort((col, -score, row))
+            row, col = row[order], col[order]
+            first = np.concatenate([[True], row[1:] != row[:-1]])
+            best[row[first]] = col[first]
+        return shared
+
+    def _trace_block(self, shared, block, fanout_words, trace, seconds):
+        # Candidates (GSC rows sharing a word), fuzzy scorings past MIN_SIMILARITY and the
+        # two highest raw fuzzy scores per row, whether or not they passed the other rules
+        per_row = np.diff(shared.indptr)
+        trace['candidates'][block] = per_row
+        pairs = per_row.sum()
+        trace['ms'][block] = seconds * 1000 * (per_row / pairs if pairs else 1 / len(block))
+        local = np.repeat(np.arange(len(block)), per_row)
+        col = shared.indices
+        similarity = shared.data / np.maximum(fanout_words[block[local]], self._word_counts[col])
+        fuzzy = col != trace['exact'][block[local]]
+        trace['scored'][block] = np.bincount(local[fuzzy & (similarity > MIN_SIMILARITY)], minlength=len(block))
+        score = np.where(fuzzy, similarity * FUZZY_WEIGHT, -np.inf)
+
+        # Segment reductions over the CSR rows: highest score, then the earliest GSC row among ties
+        nonempty = per_row > 0
+        starts = shared.indptr[:-1][nonempty]
+        if not len(starts):
+            return
+        last = len(self.queries)  # past every GSC row index
+        for name in ('top', 'second'):
+            row_max = np.full(len(block), -np.inf)
+            row_max[nonempty] = np.maximum.reduceat(score, starts)
+            tied = np.where((score == row_max[local]) & np.isfinite(score), col, last)
+            row_col = np.full(len(block), last)
+            row_col[nonempty] = np.minimum.reduceat(tied, starts)
+            found = row_col != last
+            trace[f'{name}_score'][block[found]] = row_max[found]
+            trace[f'{name}_idx'][block[found]] = row_col[found]
+            # Drop the pick so the next pass finds the runner-up
+            score = np.where(col == row_col[local], -np.inf, score)
+
+    def trace_records(self, trace):
+        """One DIAGNOSTIC_COLUMNS dict per row from a best_matches() trace."""
+        records = []
+        for i, exact in enumerate(trace['exact'].tolist()):
+            if not trace['reached'][i]:
+                records.append(dict.fromkeys(DIAGNOSTIC_COLUMNS))
+                continue
+            # An exact match always leads; its own GSC row counts as a candidate even without long words
+            ranked = [(EXACT_SCORE, exact)] if exact >= 0 else []
+            for name in ('top', 'second'):
+                if trace[f'{name}_idx'][i] >= 0:
+                    ranked.append((float(trace[f'{name}_score'][i]), int(trace[f'{name}_idx'][i])))
+            ranked = ranked[:2] + [(None, None)] * (2 - len(ranked[:2]))
+            candidates = int(trace['candidates'][i])
+            records.append({
+                'candidates': candidates + (exact >= 0 and candidates == 0),
+                'scored': int(trace['scored'][i]) + (exact >= 0),
+                'best_score': ranked[0][0],
+                'best_gsc_query': self.queries[ranked[0][1]] if ranked[0][1] is not None else None,
+                'runner_up_score': ranked[1][0],
+                'runner_up_gsc_query': self.queries[ranked[1][1]] if ranked[1][1] is not None else None,
+                'ms': float(trace['ms'][i]),
+            })
+        return records
+
+
+def match_order(fanout_rows):
+    """Row indices in the order fuzzy matching should spend a time budget on (TYPE_PRIORITY, then length)."""
+    rank = {name: i for i, name in enumerate(TYPE_PRIORITY)}
+    types = np.fromiter((rank.get(row.get('type'), len(TYPE_PRIORITY)) for row in fanout_rows),
+                        dtype=np.int64, count=len(fanout_rows))
+    lengths = np.fromiter((len(normalize(row.get('query'))) for row in fanout_rows),
+                          dtype=np.int64, count=len(fanout_rows))
+    return np.lexsort((lengths, types))
+
+
+def _record(fanout_row, gsc_index, idx):
+    record = {
+        'fanout_query': fanout_row.get('query'),
+        'type': fanout_row.get('type'),
+        'user_intent': fanout_row.get('user_intent'),
+        'routing_format': fanout_row.get('routing_format'),
+    }
+    if idx == NOT_EVALUATED:
+        # Unknown, not a gap: no position and nothing counted
+        record.update(position=None, clicks=0, impressions=0, ctr=None,
+                      matched_gsc_query=None, is_gap=False)
+    elif idx is None:
+        record.update(position=None, clicks=0, impressions=0, ctr='0%',
+                      matched_gsc_query=None, is_gap=True)
+    else:
+        gsc_row = gsc_index.rows[idx]
+        record.update(
+            position=_float(gsc_row.get('Position')),
+            clicks=_int(gsc_row.get('Clicks')),
+            impressions=_int(gsc_row.get('Impressions')),
+            ctr=gsc_row.get('CTR'),
+            matched_gsc_query=gsc_row.get('Top queries'),
+            is_gap=False,
+        )
+    return record
+
+
+def match_queries(fanout_df, gsc_df, progress=None, diagnostics=None, gsc_index=None, time_budget=None):
+    # progress(stage, fraction) is called periodically and may raise to abort.
+    # Pass a list as `diagnostics` to collect one trace per fan-out row, and a
+    # prebuilt `gsc_index` to reuse one GSC export across fan-out files.
+    # With `time_budget` (seconds) fuzzy matching stops when it runs out and the
+    # result gains an `evaluated` column.
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    if gsc_index is None:
+        gsc_index = GscIndex(gsc_df)
+    fanout_rows = fanout_df.where(fanout_df.notna(), None).to_dict('records')
+    order = match_order(fanout_rows) if deadline is not None else None
+    trace = {} if diagnostics is not None else None
+    indices = gsc_index.best_matches([normalize(row.get('query')) for row in fanout_rows], progress,
+                                     order=order, deadline=deadline, trace=trace)
+    records = [_record(row, gsc_index, None if idx == -1 else int(idx)) for row, idx in zip(fanout_rows, indices)]
+    matched = pd.DataFrame.from_records(records, columns=MATCHED_COLUMNS)
+    if deadline is not None:
+        matched['evaluated'] = indices != NOT_EVALUATED
+    if trace is not None:
+        diagnostics.extend(gsc_index.trace_records(trace))
+    return matched
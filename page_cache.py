@@ -0,0 +1,63 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+PAYLOAD_ROOT = Path(__file__).parent / 'static' / 'payloads'
+KEEP_PAYLOADS = 32
+# Part of every key: bump it whenever the payload format changes, since keys
+# are derived from the inputs and would otherwise keep serving old payloads
+PAYLOAD_VERSION = 1
+
+
+def payload_key(*parts):
+    """Cache key for a page payload, from what produced it (job key, extra inputs, flags).
+
+    Known before the analysis runs, so a reload with the same inputs can render
+    from the browser's cache without waiting for (or even re-running) the job.
+    """
+    digest = hashlib.sha256(f'v{PAYLOAD_VERSION}'.encode())
+    for part in parts:
+        if isinstance(part, (bytes, bytearray)):
+            part = hashlib.sha256(part).hexdigest()
+        digest.update(hashlib.sha256(repr(part).encode('utf-8')).digest())
+    return digest.hexdigest()
+
+
+def _stub(key, url_base):
+    return {'cache': {'key': key, 'url': f'{url_base}/{key}.json'}}
+
+
+def cached(key, url_base):
+    """The stub for an already published payload, or None."""
+    try:
+        # Refresh its mtime so pruning keeps payloads that are still being shown
+        os.utime(PAYLOAD_ROOT / f'{key}.json')
+    except FileNotFoundError:
+        return None
+    return _stub(key, url_base)
+
+
+def publish(page_json, key, url_base):
+    """Write a page payload under static/payloads/<key>.json; returns the stub the page embeds.
+
+    The page looks the key up in its IndexedDB cache and only fetches the file on
+    a miss, so rerenders with unchanged inputs send a few bytes instead of the payload.
+    The file is only written when it is missing.
+    """
+    stub = cached(key, url_base)
+    if stub is not None:
+        return stub
+    PAYLOAD_ROOT.mkdir(parents=True, exist_ok=True)
+    fd, staging = tempfile.mkstemp(dir=PAYLOAD_ROOT, prefix=f'.{key}.', suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(page_json)
+    os.replace(staging, PAYLOAD_ROOT / f'{key}.json')
+    _prune()
+    return _stub(key, url_base)
+
+
+def _prune():
+    files = sorted(PAYLOAD_ROOT.glob('*.json'), key=lambda p: p.stat().st_mtime, reverse=True)
+    for stale in files[KEEP_PAYLOADS:]:
+        stale.unlink(missing_ok=True)
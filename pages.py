@@ -0,0 +1,51 @@
+from matching import normalize
+
+TOP_PAGES = 3
+
+# Header names seen in GSC query+page exports (UI, Looker Studio and API dumps)
+QUERY_COLUMNS = ('Query', 'Top queries', 'Queries', 'query')
+PAGE_COLUMNS = ('Page', 'Landing Page', 'Landing page', 'Top pages', 'URL', 'page')
+
+
+def _find_column(df, candidates):
+    for name in candidates:
+        if name in df.columns:
+            return name
+    raise ValueError(f"Page export needs one of these columns: {', '.join(candidates)}")
+
+
+def build_page_index(pages_df, top=TOP_PAGES):
+    """Hash index of normalized query -> its top pages by clicks (then impressions).
+
+    One pass over the export; each bucket keeps at most `top` entries, so building
+    is linear in the number of rows.
+    """
+    query_col = _find_column(pages_df, QUERY_COLUMNS)
+    page_col = _find_column(pages_df, PAGE_COLUMNS)
+    clicks = pages_df['Clicks'].fillna(0).tolist() if 'Clicks' in pages_df else [0] * len(pages_df)
+    impressions = pages_df['Impressions'].fillna(0).tolist() if 'Impressions' in pages_df else [0] * len(pages_df)
+
+    index = {}
+    for query, page, c, i in zip(pages_df[query_col].tolist(), pages_df[page_col].tolist(), clicks, impressions):
+        if not isinstance(page, str):
+            continue
+        bucket = index.setdefault(normalize(query), [])
+        entry = (-int(c), -int(i), page)
+        if len(bucket) < top:
+            bucket.append(entry)
+            bucket.sort()
+        elif entry < bucket[-1]:
+            bucket[-1] = entry
+            bucket.sort()
+    return {
+        query: [{'page': page, 'clicks': -c, 'impressions': -i} for c, i, page in bucket]
+        for query, bucket in index.items()
+    }
+
+
+def attach_pages(matched_df, index):
+    # Top pages per matched row (empty for content gaps), aligned with matched_df
+    return [
+        index.get(normalize(query), []) if isinstance(query, str) else []
+        for query in matched_df['matched_gsc_query'].tolist()
+    ]
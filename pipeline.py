@@ -0,0 +1,271 @@
+import importlib.util
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import pandas as pd
+
+from clustering import cluster_queries
+from compare import change_counts, compare_positions
+from coverage import CoverageIndex, missing_terms, summarize
+from cube import build_cube
+from matching import DIAGNOSTIC_COLUMNS, GscIndex, match_queries
+from sampling import estimate_totals, stratified_sample
+from spill import cached_parse
+
+# Result entries sent to the embedded page
+PAGE_KEYS = ('matched', 'clusters', 'coverage', 'estimates', 'preview', 'pages', 'tiled', 'report', 'cube')
+
+# Execution backend for ingest, matching and the cube: "pandas" (default) or "polars".
+# polars is optional: without it, runs asking for it use the pandas backend.
+BACKENDS = ('pandas', 'polars')
+DEFAULT_BACKEND = os.environ.get('FANOUT_BACKEND', 'pandas')
+POLARS_AVAILABLE = importlib.util.find_spec('polars') is not None
+
+# Inputs with more fan-out rows than this get a sampled preview first
+PREVIEW_MIN_ROWS = 1000
+PREVIEW_SAMPLE_SIZE = 400
+
+
+def _parse_csv(data):
+    return pd.read_csv(io.BytesIO(data))
+
+
+def read_csv(data):
+    # Accepts raw bytes (uploads) or anything pandas can read. Bytes go through the
+    # Arrow spill, so the same file is only parsed once across restarts and workers.
+    if isinstance(data, (bytes, bytearray)):
+        return cached_parse(bytes(data), _parse_csv)
+    return pd.read_csv(data)
+
+
+def _no_progress(stage, fraction):
+    pass
+
+
+class GscIndexes:
+    """Everything a run derives from one GSC export, so it can be reused across fan-out files."""
+
+    def __init__(self, gsc_df):
+        self.rows = len(gsc_df)
+        self.match = GscIndex(gsc_df)
+        self.coverage = CoverageIndex(gsc_df)
+
+
+class IndexCache:
+    """LRU of GscIndexes by content hash with single-flight builds.
+
+    The first caller for an export builds its indexes; callers arriving while
+    that build runs wait on the same future instead of building again. Shared by
+    the API's requests and by the app's preview and background job.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._properties = {}
+        self.builds = 0
+        self.hits = 0
+        self.joined = 0
+
+    def get_or_build(self, key, gsc_bytes):
+        with self._lock:
+            future = self._entries.get(key)
+            if future is not None:
+                self._entries.move_to_end(key)
+                if future.done():
+                    self.hits += 1
+                else:
+                    self.joined += 1
+                builder = False
+            else:
+                future = Future()
+                self._entries[key] = future
+                self.builds += 1
+                builder = True
+        if builder:
+            try:
+                future.set_result(GscIndexes(read_csv(gsc_bytes)))
+            except Exception as exc:
+                with self._lock:
+                    self._entries.pop(key, None)
+                future.set_exception(exc)
+            with self._lock:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return future.result()
+
+    def lookup(self, ref):
+        # A reference is a content hash or a property name registered with it
+        with self._lock:
+            key = self._properties.get(ref, ref)
+            future = self._entries.get(key)
+            if future is None:
+                raise KeyError(ref)
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return key, future.result()
+
+    def register(self, prop, key):
+        with self._lock:
+            self._properties[prop] = key
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'properties': len(self._properties),
+                'builds': self.builds,
+                'hits': self.hits,
+                'joined_in_flight': self.joined,
+            }
+
+
+def run_analysis(fanout_df, gsc_df, cluster_threshold=None, progress=None, diagnostics=False, indexes=None,
+                 time_budget=None):
+    # gsc_df may be None when prebuilt `indexes` are passed
+    progress = progress or _no_progress
+    indexes = indexes or GscIndexes(gsc_df)
+    traces = [] if diagnostics else None
+    matched = match_queries(fanout_df, None, progress=progress, diagnostics=traces, gsc_index=indexes.match,
+                            time_budget=time_budget)
+    result = aggregate(matched, indexes.coverage, cluster_threshold, progress)
+    if traces is not None:
+        # Row-aligned with matched; kept out of PAGE_KEYS so the page payload is unchanged
+        result['diagnostics'] = pd.DataFrame.from_records(traces, columns=DIAGNOSTIC_COLUMNS)
+    return result
+
+
+def aggregate(matched, coverage_index, cluster_threshold=None, progress=None, cube=None):
+    # Everything after matching; shared by both backends
+    progress = progress or _no_progress
+    progress('aggregate', 0.0)
+    missing = missing_terms(matched, coverage_index)
+    matched['missing_terms'] = missing
+    coverage = summarize(matched, missing)
+    if cube is None:
+        cube = build_cube(matched)
+
+    clusters = None
+    if cluster_threshold is not None:
+        progress('aggregate', 0.5)
+        clusters = cluster_queries(matched, cluster_threshold)
+    return {'matched': matched, 'clusters': clusters, 'coverage': coverage, 'cube': cube}
+
+
+def run_analysis_polars(fanout_bytes, gsc_bytes, cluster_threshold=None, progress=None):
+    from polars_backend import match_and_aggregate
+
+    matched, cube, gsc_df = match_and_aggregate(fanout_bytes, gsc_bytes, progress=progress)
+    return aggregate(matched, CoverageIndex(gsc_df), cluster_threshold, progress, cube=cube)
+
+
+def summary_stats(matched):
+    # Same headline numbers as the page's stats grid
+    evaluated = matched['evaluated'].astype(bool) if 'evaluated' in matched else True
+    ranking = matched[~matched['is_gap'].astype(bool) & evaluated]
+    stats = {
+        'queries': len(matched),
+        'ranking': len(ranking),
+        'gaps': int((matched['is_gap'].astype(bool) & evaluated).sum()),
+        'top3': int((ranking['position'] <= 3).sum()),
+        'top10': int((ranking['position'] <= 10).sum()),
+        'clicks': int(ranking['clicks'].sum()),
+    }
+    if 'evaluated' in matched:
+        stats['evaluated'] = int(evaluated.sum())
+    if 'change' in matched:
+        stats['changes'] = change_counts(matched)
+    return stats
+
+
+def to_json(result, keys=PAGE_KEYS):
+    # DataFrames go through to_json so NaN becomes null instead of invalid JSON
+    parts = []
+    for key, value in result.items():
+        if key not in keys:
+            continue
+        if isinstance(value, pd.DataFrame):
+            encoded = value.to_json(orient='records')
+        else:
+            encoded = json.dumps(value, separators=(',', ':'))
+        parts.append(f'{json.dumps(key)}:{encoded}')
+    return '{' + ','.join(parts) + '}'
+
+
+def extend_page(page_json, extras):
+    # Splice extra keys into an already-built page payload without re-serializing it
+    encoded = to_json(extras)
+    if encoded == '{}':
+        return page_json
+    return page_json[:-1] + ',' + encoded[1:]
+
+
+def export_table(result, pages=None):
+    # Flat matched table for CSV download; list columns become "; "-joined text
+    table = result['matched'].copy()
+    table['missing_terms'] = table['missing_terms'].map('; '.join)
+    if pages is not None:
+        table['top_page'] = [row[0]['page'] if row else None for row in pages]
+        table['top_pages'] = ['; '.join(f"{p['page']} ({p['clicks']})" for p in row) for row in pages]
+    if result.get('diagnostics') is not None:
+        table = table.join(result['diagnostics'].add_prefix('diag_'))
+    return table
+
+
+def uses_gsc_index(backend=None, diagnostics=False, time_budget=None):
+    # Diagnostics and time budgets come from matching.GscIndex, so they always
+    # use the pandas backend
+    return ((backend or DEFAULT_BACKEND) != 'polars' or not POLARS_AVAILABLE
+            or diagnostics or time_budget is not None)
+
+
+def build_analysis(fanout_bytes, gsc_bytes, cluster_threshold=None, progress=None, diagnostics=False,
+                   backend=None, time_budget=None, previous_gsc_bytes=None, indexes=None):
+    # Stages: ingest -> match -> aggregate -> [compare] -> payload, reported through progress().
+    # The page JSON is built here too so reruns only hand over a ready string.
+    # `indexes` are prebuilt GscIndexes for gsc_bytes (see IndexCache); only the
+    # pandas backend uses them. `previous_gsc_bytes` is an older GSC export to
+    # compare positions against.
+    progress = progress or _no_progress
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    progress('ingest', 0.0)
+    if not uses_gsc_index(backend, diagnostics, time_budget):
+        result = run_analysis_polars(fanout_bytes, gsc_bytes, cluster_threshold, progress=progress)
+    else:
+        fanout_df = read_csv(fanout_bytes)
+        gsc_df = None if indexes is not None else read_csv(gsc_bytes)
+        result = run_analysis(fanout_df, gsc_df, cluster_threshold, progress=progress, diagnostics=diagnostics,
+                              indexes=indexes, time_budget=time_budget)
+    if previous_gsc_bytes is not None:
+        progress('compare', 0.0)
+        matched = result['matched']
+        result['matched'] = matched.join(compare_positions(matched, read_csv(previous_gsc_bytes)))
+    progress('payload', 0.0)
+    result['page'] = to_json(result)
+    return result
+
+
+def build_preview_payload(fanout_bytes, gsc_bytes, cluster_threshold=None,
+                          sample_size=PREVIEW_SAMPLE_SIZE, indexes=None):
+    # Returns None when the input is small enough to just run in full. Pass the
+    # same `indexes` as the full run so the GSC export is only indexed once.
+    fanout_df = read_csv(fanout_bytes)
+    if len(fanout_df) <= PREVIEW_MIN_ROWS:
+        return None
+    sample_df, strata_sizes = stratified_sample(fanout_df, sample_size)
+    gsc_df = None if indexes is not None else read_csv(gsc_bytes)
+    result = run_analysis(sample_df, gsc_df, cluster_threshold, indexes=indexes)
+    result['estimates'] = estimate_totals(result['matched'], strata_sizes)
+    result['preview'] = {
+        'sampled': len(sample_df),
+        'total': len(fanout_df),
+        'strata': len(strata_sizes),
+    }
+    return to_json(result)
@@ -0,0 +1,281 @@
+"""Polars lazy-frame backend: ingest, matching and the cube as one query plan.
+
+Produces the same matched table as matching.match_queries():
+
+- exact matches are an equi-join on the normalized query (earliest GSC row wins);
+- fuzzy candidates come from joining a row's rarest fan-out words (a prefix
+  filter: a pair that shares none of them can't reach the similarity cut-off)
+  against each GSC query's distinct words; the row's other words are then
+  checked against just those candidates, which gives the same shared-word
+  counts (with repeats) as the postings index;
+- the similarity, length and score rules and the earliest-row tie-break are
+  applied as column expressions.
+
+Selected with pipeline's backend setting (FANOUT_BACKEND=polars).
+"""
+import io
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from cube import BUCKET_EDGES, BUCKET_LABELS, GAP_BUCKET, DIMENSIONS
+from matching import (FUZZY_WEIGHT, MATCHED_COLUMNS, MAX_BLOCK_PAIRS, MAX_LENGTH_DIFF, MIN_SCORE,
+                      MIN_SIMILARITY, MIN_WORD_LENGTH)
+
+FANOUT_COLUMNS = ['query', 'type', 'user_intent', 'routing_format']
+GSC_COLUMNS = ['Top queries', 'Clicks', 'Impressions', 'CTR', 'Position']
+# Most fan-out rows per fuzzy join; blocks are cut on candidate pairs first (matching.MAX_BLOCK_PAIRS)
+FUZZY_BLOCK_ROWS = 2000
+
+
+def _source(data):
+    return io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+
+
+def _normalized(column):
+    # matching.normalize(): missing -> '', then lower() and strip()
+    return pl.col(column).cast(pl.String).fill_null('').str.to_lowercase().str.strip_chars()
+
+
+def _project(lf, columns):
+    # Missing columns read as nulls, as row.get() does in the default backend
+    present = lf.collect_schema().names()
+    return lf.select([pl.col(c) if c in present else pl.lit(None, pl.String).alias(c) for c in columns])
+
+
+def scan_inputs(fanout, gsc):
+    """Lazy frames over both CSVs, projected to the columns matching reads."""
+    fanout_lf = (
+        _project(pl.scan_csv(_source(fanout), infer_schema_length=0), FANOUT_COLUMNS)
+        .with_row_index('fidx')
+        .with_columns(fq=_normalized('query'))
+        .with_columns(
+            fwords=pl.col('fq').str.split(' '),
+            flen=pl.col('fq').str.len_chars(),
+        )
+        .with_columns(fn=pl.col('fwords').list.len())
+    )
+    gsc_lf = (
+        _project(pl.scan_csv(_source(gsc), schema_overrides={'Top queries': pl.String, 'CTR': pl.String}),
+                 GSC_COLUMNS)
+        .with_row_index('gidx')
+        .with_columns(gq=_normalized('Top queries'))
+        .with_columns(
+            gwords=pl.col('gq').str.split(' '),
+            glen=pl.col('gq').str.len_chars(),
+        )
+        .with_columns(gn=pl.col('gwords').list.len())
+    )
+    return fanout_lf, gsc_lf
+
+
+def gsc_plans(gsc_lf):
+    """The GSC side of every block's joins; collect once when planning several blocks.
+
+    exact: earliest GSC row per normalized query. postings: GSC rows per word of
+    MIN_WORD_LENGTH+ characters, with a word id. words: each GSC query's distinct
+    word ids, plus `key` = (gidx, wid) as one integer for membership tests.
+    """
+    words = (
+        gsc_lf.select('gidx', 'gn', 'glen', word=pl.col('gwords'))
+        .explode('word')
+        .filter(pl.col('word').str.len_chars() >= MIN_WORD_LENGTH)
+        .unique(['gidx', 'word'])
+    )
+    postings = words.group_by('word').agg(postings=pl.len()).with_row_index('wid')
+    words = (
+        words.join(postings.select('word', 'wid'), on='word')
+        .select('gidx', 'gn', 'glen', 'wid', key=_pair_key('gidx', 'wid'))
+    )
+    return {
+        'exact': gsc_lf.group_by('gq').agg(exact_idx=pl.col('gidx').min()),
+        'words': words,
+        'postings': postings,
+    }
+
+
+def _pair_key(gidx, wid):
+    # Row and word ids are both u32
+    return pl.col(gidx).cast(pl.Int64) * (1 << 32) + pl.col(wid).cast(pl.Int64)
+
+
+def _prefix_words(fanout_lf, postings):
+    # Fan-out words of MIN_WORD_LENGTH+ characters (repeats kept), rarest first per row.
+    # similarity > MIN_SIMILARITY needs `required` shared words, so a pair sharing none
+    # of the row's m - required + 1 rarest words can't match: only those seed candidates.
+    # Words no GSC query has can't be shared; they rank first and are dropped here.
+    required = (MIN_SIMILARITY * pl.col('fn') - 1e-9).floor().cast(pl.Int64) + 1
+    return (
+        fanout_lf.select('fidx', 'fn', 'flen', word=pl.col('fwords'))
+        .explode('word')
+        .filter(pl.col('word').str.len_chars() >= MIN_WORD_LENGTH)
+        .join(postings, on='word', how='left')
+        .with_columns(
+            postings=pl.col('postings').fill_null(0),
+            prefix=pl.len().over('fidx') - required + 1,
+            rank=pl.col('postings').rank('ordinal').over('fidx'),
+        )
+        .with_columns(seed=pl.col('rank') <= pl.col('prefix'))
+        .filter(pl.col('wid').is_not_null())
+    )
+
+
+def row_pairs_plan(fanout_lf, postings):
+    # Worst-case rows per fan-out row in the candidate join: its seed words'
+    # postings, each checked against every one of its words
+    return (
+        _prefix_words(fanout_lf, postings)
+        .group_by('fidx')
+        .agg(pairs=pl.col('postings').filter(pl.col('seed')).sum() * pl.len())
+    )
+
+
+def blocks(row_pairs, total):
+    """(start, stop) fan-out row ranges of about MAX_BLOCK_PAIRS candidate pairs each.
+
+    Cut on the running pair total like GscIndex.best_matches(), so a block's
+    join stays bounded however common the words are; at most FUZZY_BLOCK_ROWS rows.
+    """
+    pairs = np.zeros(total, dtype=np.int64)
+    pairs[row_pairs['fidx'].to_numpy()] = row_pairs['pairs'].to_numpy()
+    pair_bounds = np.cumsum(pairs)
+    start = 0
+    while start < total:
+        done = pair_bounds[start - 1] if start else 0
+        stop = max(start + 1, int(np.searchsorted(pair_bounds, done + MAX_BLOCK_PAIRS, side='right')))
+        stop = min(stop, start + FUZZY_BLOCK_ROWS, total)
+        yield start, stop
+        start = stop
+
+
+def _fuzzy_best(fanout_lf, gsc):
+    fanout_words = _prefix_words(fanout_lf, gsc['postings'])
+    longer = pl.max_horizontal('fn', 'gn')
+    # One row per shared seed word occurrence. The length rule is per pair, and
+    # count <= fn caps similarity at fn / longer.
+    seeded = (
+        fanout_words.filter(pl.col('seed'))
+        .join(gsc['words'], on='wid')
+        .filter(
+            ((pl.col('flen').cast(pl.Int64) - pl.col('glen').cast(pl.Int64)).abs() < MAX_LENGTH_DIFF)
+            & (pl.col('fn') > MIN_SIMILARITY * longer)
+        )
+        .select('fidx', 'gidx', 'fn', 'gn')
+    )
+    # The rest of each candidate's shared words: its other occurrences the GSC query has
+    rest = (
+        seeded.unique(['fidx', 'gidx'])
+        .join(fanout_words.filter(~pl.col('seed')).select('fidx', 'wid'), on='fidx')
+        .with_columns(key=_pair_key('gidx', 'wid'))
+        .join(gsc['words'].select('key'), on='key', how='semi')
+        .select('fidx', 'gidx', 'fn', 'gn')
+    )
+    return (
+        pl.concat([seeded, rest])
+        .group_by('fidx', 'gidx')
+        .agg(pl.len().alias('count'), pl.first('fn'), pl.first('gn'))
+        .with_columns(similarity=pl.col('count') / longer)
+        .filter(pl.col('similarity') > MIN_SIMILARITY)
+        .with_columns(score=pl.col('similarity') * FUZZY_WEIGHT)
+        .filter(pl.col('score') > MIN_SCORE)
+        # Highest score, then the earliest GSC row
+        .sort(['fidx', 'score', 'gidx'], descending=[False, True, False])
+        .group_by('fidx', maintain_order=True)
+        .first()
+        .select('fidx', fuzzy_idx='gidx')
+    )
+
+
+def match_plan(fanout_lf, gsc_lf, block=None, gsc=None):
+    """Lazy matched table (plus a gsc index column) for fan-out rows in `block` = (start, stop).
+
+    `gsc` is gsc_plans(gsc_lf), collected when planning several blocks.
+    """
+    if block is not None:
+        fanout_lf = fanout_lf.filter(pl.col('fidx').is_between(block[0], block[1], closed='left'))
+    gsc = gsc_plans(gsc_lf) if gsc is None else gsc
+    fanout_lf = fanout_lf.join(gsc['exact'], left_on='fq', right_on='gq', how='left')
+    fuzzy = _fuzzy_best(fanout_lf.filter(pl.col('exact_idx').is_null()), gsc)
+    gsc_rows = gsc_lf.select('gidx', *GSC_COLUMNS)
+    return (
+        fanout_lf.join(fuzzy, on='fidx', how='left')
+        .with_columns(gidx=pl.coalesce('exact_idx', 'fuzzy_idx'))
+        .join(gsc_rows, on='gidx', how='left')
+        .sort('fidx')
+        .select(
+            fanout_query=pl.col('query'),
+            type=pl.col('type'),
+            user_intent=pl.col('user_intent'),
+            routing_format=pl.col('routing_format'),
+            position=pl.col('Position').cast(pl.Float64, strict=False),
+            # _int(): int(float(value)), 0 for gaps and blank cells
+            clicks=pl.when(pl.col('gidx').is_null()).then(0)
+            .otherwise(pl.col('Clicks').cast(pl.Float64, strict=False).cast(pl.Int64, strict=False).fill_null(0)),
+            impressions=pl.when(pl.col('gidx').is_null()).then(0)
+            .otherwise(pl.col('Impressions').cast(pl.Float64, strict=False).cast(pl.Int64, strict=False).fill_null(0)),
+            ctr=pl.when(pl.col('gidx').is_null()).then(pl.lit('0%')).otherwise(pl.col('CTR')),
+            matched_gsc_query=pl.col('Top queries'),
+            is_gap=pl.col('gidx').is_null(),
+        )
+    )
+
+
+def cube_plan(matched_lf):
+    # Same cells and order as cube.build_cube(): groups in order of first appearance
+    gap = pl.col('is_gap') | pl.col('position').is_null()
+    # Right-closed buckets, as np.searchsorted(side='left') in cube.position_bucket()
+    bucket = pl.lit(BUCKET_LABELS[-1])
+    for edge, label in reversed(list(zip(BUCKET_EDGES, BUCKET_LABELS))):
+        bucket = pl.when(pl.col('position') <= edge).then(pl.lit(label)).otherwise(bucket)
+    return (
+        matched_lf.with_columns(
+            bucket=pl.when(gap).then(pl.lit(GAP_BUCKET)).otherwise(bucket),
+            ranking=~gap,
+            gaps=gap,
+            position_sum=pl.when(gap).then(0.0).otherwise(pl.col('position')),
+        )
+        .group_by(DIMENSIONS, maintain_order=True)
+        .agg(
+            count=pl.len().cast(pl.Int64),
+            ranking=pl.col('ranking').sum().cast(pl.Int64),
+            gaps=pl.col('gaps').sum().cast(pl.Int64),
+            clicks=pl.col('clicks').fill_null(0).sum(),
+            impressions=pl.col('impressions').fill_null(0).sum(),
+            position_sum=pl.col('position_sum').sum(),
+        )
+    )
+
+
+def to_pandas(frame, columns):
+    # Build from plain lists so dtypes come out exactly as pandas infers them for the default backend
+    return pd.DataFrame({column: frame[column].to_list() for column in columns}, columns=columns)
+
+
+def match_and_aggregate(fanout, gsc, progress=None):
+    """(matched, cube, gsc_df) as pandas DataFrames, from CSV bytes or paths.
+
+    gsc_df holds just the columns coverage.CoverageIndex reads.
+    """
+    fanout_lf, gsc_lf = scan_inputs(fanout, gsc)
+    # Scan each CSV once; the per-block plans then start from memory
+    fanout_df, gsc_df = pl.collect_all([fanout_lf, gsc_lf])
+    fanout_lf, gsc_lf = fanout_df.lazy(), gsc_df.lazy()
+    # The GSC side of the joins is the same for every block: build it once
+    plans = gsc_plans(gsc_lf)
+    gsc = dict(zip(plans, (frame.lazy() for frame in pl.collect_all(list(plans.values())))))
+    total = fanout_df.height
+    parts = []
+    for start, stop in blocks(row_pairs_plan(fanout_lf, gsc['postings']).collect(), total):
+        if progress is not None:
+            progress('match', start / total)
+        parts.append(match_plan(fanout_lf, gsc_lf, (start, stop), gsc).collect())
+    if not parts:
+        parts.append(match_plan(fanout_lf, gsc_lf, None, gsc).collect())
+    matched = pl.concat(parts)
+    cube = cube_plan(matched.lazy()).collect()
+    return (
+        to_pandas(matched, MATCHED_COLUMNS),
+        to_pandas(cube, list(cube.columns)),
+        to_pandas(gsc_df, ['Top queries', 'Impressions']),
+    )
@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+
+from pipeline import extend_page
+from template import render_page
+
+REPORT_TITLE = 'Query Fan-Out Position Report'
+
+
+def build_report(analysis, pages=None, title=REPORT_TITLE, generated=None):
+    """Single-file HTML report of a finished analysis, for offline viewing and sharing.
+
+    Built from the analysis page payload (matched rows and aggregates only, never the
+    raw GSC export), so its size follows the number of fan-out rows. Scripts are
+    inlined by the template loader and nothing is matched in the browser.
+    """
+    generated = generated or datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M UTC')
+    extras = {'report': {'title': title, 'generated': generated, 'queries': len(analysis['matched'])}}
+    if pages is not None:
+        extras['pages'] = pages
+    return render_page(extend_page(analysis['page'], extras))
@@ -0,0 +1,65 @@
+import math
+
+import pandas as pd
+
+STRATA = ['type', 'routing_format']
+Z_95 = 1.96
+
+
+def strata_labels(df):
+    return df[STRATA].fillna('').astype(str).agg(' | '.join, axis=1)
+
+
+def stratified_sample(fanout_df, size, seed=0):
+    """Proportional stratified sample of fan-out rows, at least two rows per stratum
+    where available so every stratum has a variance estimate."""
+    labels = strata_labels(fanout_df)
+    counts = labels.value_counts()
+    fraction = min(1.0, size / max(1, len(fanout_df)))
+    picked = []
+    for label, count in counts.items():
+        take = min(count, max(2, round(count * fraction)))
+        rows = labels.index[labels == label]
+        picked.append(pd.Series(rows).sample(n=take, random_state=seed))
+    index = pd.concat(picked).sort_values().to_numpy()
+    return fanout_df.loc[index], counts
+
+
+def _metrics(matched):
+    ranking = ~matched['is_gap'].astype(bool)
+    position = matched['position'].astype(float)
+    return pd.DataFrame({
+        'ranking': ranking.astype(float),
+        'gaps': (~ranking).astype(float),
+        'top3': (ranking & (position <= 3)).astype(float),
+        'top10': (ranking & (position <= 10)).astype(float),
+        'clicks': matched['clicks'].where(ranking, 0).fillna(0).astype(float),
+    })
+
+
+def estimate_totals(sample_matched, strata_sizes):
+    """Stratified estimates of the stats-grid totals with 95% confidence half-widths.
+
+    sample_matched must keep the fan-out row order of the sample so its rows line
+    up with their strata.
+    """
+    metrics = _metrics(sample_matched.reset_index(drop=True))
+    labels = strata_labels(sample_matched.reset_index(drop=True))
+    grouped = metrics.groupby(labels)
+    n_h = grouped.size()
+    N_h = strata_sizes.reindex(n_h.index).astype(float)
+    mean = grouped.mean()
+    var = grouped.var(ddof=1).fillna(0.0)
+
+    totals = mean.mul(N_h, axis=0).sum()
+    # Finite population correction: fully sampled strata contribute no variance
+    weights = N_h ** 2 * (1 - n_h / N_h) / n_h
+    variance = var.mul(weights, axis=0).sum()
+
+    return {
+        metric: {
+            'value': int(round(totals[metric])),
+            'ci': int(math.ceil(Z_95 * math.sqrt(max(0.0, variance[metric])))),
+        }
+        for metric in metrics.columns
+    }
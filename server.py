@@ -0,0 +1,288 @@
+"""Local HTTP API for the fan-out analysis (standard library only).
+
+    python server.py --port 8765
+
+Endpoints (JSON bodies; CSV files are sent as text):
+
+    POST /gsc-index  {"gsc_csv": "...", "property": "example.com"}
+        -> {"gsc_index": "<sha256>", "property": ..., "rows": n}
+    POST /analyze    {"fanout_csv": "...", "gsc_csv": "..." | "gsc_index": "<sha256 or property>",
+                      "cluster_threshold": 0.6, "time_budget": 30, "format": "json" | "parquet"}
+        -> stats, matched rows, clusters, coverage and cube (JSON), or the matched table (Parquet)
+    POST /slice      {"cube": [<cube rows from /analyze>], "rows": "type", "columns": "bucket",
+                      "measure": "count", "filters": {"user_intent": ["commercial"]}}
+        -> {"rows": [...], "columns": [...] | null, "values": [[...]]}; computed from the cube alone
+    GET  /metrics    request latency and throughput, index cache and queue counters
+    GET  /health
+
+"time_budget" caps fuzzy matching at that many seconds; rows it doesn't reach
+come back as not evaluated. 0 or null means no limit, as in the Streamlit app.
+
+Concurrent requests for the same GSC export share one index build; identical
+analysis requests share one run.
+"""
+import argparse
+import hashlib
+import io
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pipeline
+from cube import slice_records
+from jobs import DONE, JobQueue
+
+RESULT_KEYS = ('matched', 'clusters', 'coverage', 'cube')
+MAX_BODY_BYTES = 1 << 30
+LATENCY_WINDOW = 1000
+THROUGHPUT_WINDOW = 60.0
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self._counts = defaultdict(lambda: defaultdict(int))
+        self._finished = deque()
+        self.started_at = time.time()
+
+    def record(self, endpoint, status, seconds):
+        now = time.time()
+        with self._lock:
+            self._latency[endpoint].append(seconds)
+            self._counts[endpoint][status] += 1
+            self._finished.append(now)
+            while self._finished and self._finished[0] < now - THROUGHPUT_WINDOW:
+                self._finished.popleft()
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            endpoints = {}
+            for endpoint, samples in self._latency.items():
+                ordered = sorted(samples)
+                endpoints[endpoint] = {
+                    'requests': dict(self._counts[endpoint]),
+                    'latency_ms': {
+                        'mean': round(1000 * sum(ordered) / len(ordered), 2),
+                        'p50': round(1000 * ordered[len(ordered) // 2], 2),
+                        'p95': round(1000 * ordered[int(0.95 * (len(ordered) - 1))], 2),
+                        'max': round(1000 * ordered[-1], 2),
+                    },
+                }
+            recent = sum(t >= now - THROUGHPUT_WINDOW for t in self._finished)
+        window = min(THROUGHPUT_WINDOW, max(now - self.started_at, 1e-9))
+        return {
+            'uptime_s': round(now - self.started_at, 1),
+            'throughput_rps': round(recent / window, 3),
+            'endpoints': endpoints,
+        }
+
+
+def analyze(fanout_bytes, indexes, cluster_threshold=None, time_budget=None, progress=None):
+    # Runs on the job queue; indexes are shared, the fan-out file is per request
+    return pipeline.run_analysis(pipeline.read_csv(fanout_bytes), None, cluster_threshold,
+                                 progress=progress, indexes=indexes, time_budget=time_budget)
+
+
+class AnalysisService:
+    def __init__(self, workers=2, max_indexes=8):
+        self.indexes = pipeline.IndexCache(max_indexes)
+        self.queue = JobQueue(max_workers=workers)
+        self.metrics = Metrics()
+
+    def gsc_index(self, body):
+        gsc_bytes = _csv_field(body, 'gsc_csv')
+        key = content_key(gsc_bytes)
+        indexes = self.indexes.get_or_build(key, gsc_bytes)
+        if body.get('property'):
+            self.indexes.register(str(body['property']), key)
+        return key, indexes
+
+    def analyze(self, body):
+        if body.get('gsc_csv') is not None:
+            gsc_key, indexes = self.gsc_index(body)
+        elif body.get('gsc_index'):
+            ref = str(body['gsc_index'])
+            try:
+                gsc_key, indexes = self.indexes.lookup(ref)
+            except KeyError:
+                raise ApiError(HTTPStatus.NOT_FOUND, f'Unknown or evicted GSC index {ref!r}; upload the export again')
+        else:
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'Send either "gsc_csv" or "gsc_index"')
+        fanout_bytes = _csv_field(body, 'fanout_csv')
+        cluster_threshold = body.get('cluster_threshold')
+        if cluster_threshold is not None and not isinstance(cluster_threshold, (int, float)):
+            raise ApiError(HTTPStatus.BAD_REQUEST, '"cluster_threshold" must be a number or null')
+        time_budget = body.get('time_budget')
+        if time_budget is not None and (not isinstance(time_budget, (int, float)) or time_budget < 0):
+            raise ApiError(HTTPStatus.BAD_REQUEST, '"time_budget" must be a non-negative number of seconds or null')
+        time_budget = time_budget or None
+
+        key = content_key(f'{content_key(fanout_bytes)}:{gsc_key}:{cluster_threshold!r}:{time_budget!r}'.encode())
+        watcher = uuid.uuid4().hex
+        job = self.queue.submit(key, watcher, analyze, fanout_bytes, indexes, cluster_threshold, time_budget)
+        try:
+            job.future.result()
+        finally:
+            self.queue.release(key, watcher)
+        if job.status != DONE:
+            raise ApiError(HTTPStatus.UNPROCESSABLE_ENTITY, f'Analysis {job.status}: {job.error}')
+        return gsc_key, job.result
+
+
+def _csv_field(body, name):
+    value = body.get(name)
+    if not isinstance(value, str) or not value.strip():
+        raise ApiError(HTTPStatus.BAD_REQUEST, f'"{name}" must be the CSV file contents as text')
+    return value.encode('utf-8')
+
+
+def to_parquet(result):
+    table = pipeline.export_table(result)
+    buffer = io.BytesIO()
+    try:
+        table.to_parquet(buffer, index=False)
+    except ImportError as exc:
+        raise ApiError(HTTPStatus.NOT_ACCEPTABLE, f'Parquet output needs pyarrow: {exc}')
+    return buffer.getvalue()
+
+
+class Handler(BaseHTTPRequestHandler):
+    service = None
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._dispatch({
+            '/health': lambda: self._send_json({'status': 'ok'}),
+            '/metrics': self._metrics,
+        })
+
+    def do_POST(self):
+        self._dispatch({
+            '/gsc-index': self._gsc_index,
+            '/analyze': self._analyze,
+            '/slice': self._slice,
+        })
+
+    def _dispatch(self, routes):
+        start = time.perf_counter()
+        path = self.path.split('?', 1)[0]
+        route = routes.get(path)
+        status = HTTPStatus.NOT_FOUND
+        try:
+            if route is None:
+                raise ApiError(HTTPStatus.NOT_FOUND, f'No route for {self.command} {path}')
+            status = route()
+        except ApiError as exc:
+            status = exc.status
+            self._send_json({'error': str(exc)}, exc.status)
+        except Exception as exc:
+            status = HTTPStatus.INTERNAL_SERVER_ERROR
+            self._send_json({'error': repr(exc)}, status)
+        finally:
+            if route is not None:
+                self.service.metrics.record(f'{self.command} {path}', int(status), time.perf_counter() - start)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f'Body over {MAX_BODY_BYTES} bytes')
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError as exc:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f'Body is not valid JSON: {exc}')
+        if not isinstance(body, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'Body must be a JSON object')
+        return body
+
+    def _gsc_index(self):
+        body = self._body()
+        key, indexes = self.service.gsc_index(body)
+        return self._send_json({'gsc_index': key, 'property': body.get('property'), 'rows': indexes.rows})
+
+    def _analyze(self):
+        body = self._body()
+        output = body.get('format', 'json')
+        if output not in ('json', 'parquet'):
+            raise ApiError(HTTPStatus.BAD_REQUEST, '"format" must be "json" or "parquet"')
+        gsc_key, result = self.service.analyze(body)
+        if output == 'parquet':
+            return self._send(to_parquet(result), 'application/vnd.apache.parquet')
+        stats = json.dumps(pipeline.summary_stats(result['matched']))
+        # Result tables go through pipeline.to_json, which already handles NaN
+        data = f'{{"gsc_index":"{gsc_key}","stats":{stats},"result":{pipeline.to_json(result, RESULT_KEYS)}}}'
+        return self._send(data.encode('utf-8'), 'application/json')
+
+    def _slice(self):
+        # Dimensions: type, user_intent, routing_format, bucket. Measures: cube.MEASURES or avg_position
+        body = self._body()
+        try:
+            pivot = slice_records(body.get('cube'), body.get('rows'), body.get('columns'),
+                                  body.get('measure', 'count'), body.get('filters'))
+        except ValueError as exc:
+            raise ApiError(HTTPStatus.BAD_REQUEST, str(exc))
+        return self._send_json(pivot)
+
+    def _metrics(self):
+        snapshot = self.service.metrics.snapshot()
+        snapshot['index_cache'] = self.service.indexes.stats()
+        queue = self.service.queue.stats()
+        queue.pop('recent')
+        snapshot['queue'] = queue
+        return self._send_json(snapshot)
+
+    def _send_json(self, obj, status=HTTPStatus.OK):
+        return self._send(json.dumps(obj).encode('utf-8'), 'application/json', status)
+
+    def _send(self, data, content_type, status=HTTPStatus.OK):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        return status
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host='127.0.0.1', port=8765, workers=2, max_indexes=8):
+    handler = type('BoundHandler', (Handler,), {'service': AnalysisService(workers, max_indexes)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local HTTP API for the query fan-out analysis')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2, help='Concurrent analysis runs')
+    parser.add_argument('--max-indexes', type=int, default=8, help='GSC exports kept indexed in memory')
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, args.workers, args.max_indexes)
+    print(f'Serving on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
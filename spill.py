@@ -0,0 +1,81 @@
+"""On-disk cache of parsed CSV inputs as Arrow IPC files, re-opened by memory mapping.
+
+Entries are keyed by the sha256 of the raw bytes plus SCHEMA_VERSION (bump it
+whenever parsing changes), so a restart or another worker process re-opens the
+same file instead of re-parsing; mapped pages are shared through the OS page
+cache. Old entries are collected by age and total size after each write.
+
+pyarrow is optional: without it inputs are simply parsed every time.
+"""
+import hashlib
+import os
+import time
+from pathlib import Path
+
+SCHEMA_VERSION = 1
+CACHE_DIR = Path(os.environ.get('FANOUT_CACHE_DIR', Path(__file__).parent / '.cache' / 'inputs'))
+MAX_AGE_SECONDS = 14 * 24 * 3600
+MAX_TOTAL_BYTES = 4 * 1024 ** 3
+
+
+def entry_path(data, cache_dir=None):
+    key = hashlib.sha256(data).hexdigest()
+    return Path(cache_dir or CACHE_DIR) / f'{key}.v{SCHEMA_VERSION}.arrow'
+
+
+def cached_parse(data, parse, cache_dir=None):
+    """parse(data) -> DataFrame, served from the memory-mapped spill when present."""
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+    except ImportError:
+        return parse(data)
+
+    path = entry_path(data, cache_dir)
+    if path.exists():
+        try:
+            # One block per column, so null-free numeric columns stay views of the
+            # mapped pages (read-only) instead of being consolidated into new arrays
+            df = ipc.open_file(pa.memory_map(str(path))).read_all().to_pandas(split_blocks=True)
+        except (OSError, pa.ArrowException):
+            # Truncated or foreign file: drop it and fall through to a fresh parse
+            path.unlink(missing_ok=True)
+        else:
+            os.utime(path)
+            return df
+
+    df = parse(data)
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staging = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+        with ipc.new_file(str(staging), table.schema) as writer:
+            writer.write_table(table)
+        staging.replace(path)
+    except (OSError, pa.ArrowException):
+        # Columns Arrow can't represent (or a read-only disk) just aren't spilled
+        return df
+    collect(path.parent)
+    return df
+
+
+def collect(cache_dir=None, max_age=MAX_AGE_SECONDS, max_bytes=MAX_TOTAL_BYTES, now=None):
+    """Delete entries unused for `max_age` seconds, then least recently used ones over `max_bytes`."""
+    cache_dir = Path(cache_dir or CACHE_DIR)
+    now = time.time() if now is None else now
+    entries = []
+    for path in cache_dir.glob('*.arrow'):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        if now - stat.st_mtime > max_age or not path.name.endswith(f'.v{SCHEMA_VERSION}.arrow'):
+            path.unlink(missing_ok=True)
+        else:
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
@@ -0,0 +1,77 @@
+import functools
+import json
+import re
+from pathlib import Path
+
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+DEFAULT_TEMPLATE = "heatmap.html"
+
+# The template is valid HTML on its own; this placeholder is swapped for the JSON payload
+PAYLOAD_SLOT = "/*__PAYLOAD__*/null"
+
+
+def _minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};:,>])\s*", r"\1", css).strip()
+
+
+# <script src="..."> tags pointing inside TEMPLATE_DIR are inlined, so pages never fetch assets
+LOCAL_SCRIPT = re.compile(r'<script src="(?![a-z]+:|//)([^"]+)"></script>')
+
+
+def inline_scripts(html, base=TEMPLATE_DIR):
+    return LOCAL_SCRIPT.sub(
+        lambda m: "<script>\n" + (base / m.group(1)).read_text(encoding="utf-8") + "\n</script>",
+        html,
+    )
+
+
+def minify(html):
+    # Deliberately conservative: collapse CSS, strip indentation and drop comment-only lines.
+    # Line breaks inside <script> are kept so template literals (the AI prompt) survive intact.
+    html = re.sub(
+        r"(<style>)(.*?)(</style>)",
+        lambda m: m.group(1) + _minify_css(m.group(2)) + m.group(3),
+        html,
+        flags=re.S,
+    )
+    out = []
+    in_script = False
+    for line in html.split("\n"):
+        stripped = line.strip()
+        if "<script>" in stripped:
+            in_script = True
+        if "</script>" in stripped:
+            in_script = False
+        if in_script:
+            if stripped.startswith("//"):
+                continue
+            out.append(stripped)
+        elif stripped:
+            out.append(stripped)
+    return "\n".join(out)
+
+
+@functools.lru_cache(maxsize=None)
+def load_template(name=DEFAULT_TEMPLATE):
+    # Read and minify once per process, pre-split around the data slot
+    path = TEMPLATE_DIR / name
+    html = minify(inline_scripts(path.read_text(encoding="utf-8")))
+    head, sep, tail = html.partition(PAYLOAD_SLOT)
+    if not sep:
+        raise ValueError(f"{path} has no {PAYLOAD_SLOT} slot")
+    return head, tail
+
+
+def to_script_json(payload):
+    # Accepts a dict or an already-serialized JSON string
+    if not isinstance(payload, str):
+        payload = json.dumps(payload, separators=(",", ":"))
+    # Keep "</script>" inside string values from closing the tag early
+    return payload.replace("</", "<\\/")
+
+
+def render_page(payload, name=DEFAULT_TEMPLATE):
+    head, tail = load_template(name)
+    return head + to_script_json(payload) + tail
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The app's modules live at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Keep the Arrow spill of parsed inputs out of the working tree's cache
+os.environ.setdefault('FANOUT_CACHE_DIR', tempfile.mkdtemp(prefix='fanout-tests-'))
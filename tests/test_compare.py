@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from compare import change_counts, compare_positions
+from matching import match_queries
+
+
+def gsc(rows):
+    queries, positions = zip(*rows)
+    return pd.DataFrame({
+        'Top queries': queries,
+        'Clicks': [1] * len(rows),
+        'Impressions': [10] * len(rows),
+        'CTR': ['10%'] * len(rows),
+        'Position': positions,
+    })
+
+
+def fanout(queries):
+    return pd.DataFrame({
+        'query': queries,
+        'type': ['related'] * len(queries),
+        'user_intent': ['informational'] * len(queries),
+        'routing_format': ['guide'] * len(queries),
+    })
+
+
+CURRENT = gsc([
+    ('running shoes', 3.0),
+    ('trail running shoes women', 8.0),
+    ('waterproof hiking boots', 12.0),
+    ('winter running gloves sale', 11.0),
+    ('blank position query', None),
+    ('blank before query', 7.0),
+])
+PREVIOUS = gsc([
+    ('running shoes', 5.0),
+    ('trail running shoes women', 6.0),
+    ('cheap sandals', 9.0),
+    ('winter running gloves', 15.0),
+    ('blank position query', 4.0),
+    ('blank before query', None),
+])
+CASES = {
+    'running shoes': ('improved', 5.0, 2.0),
+    'trail running shoes women': ('declined', 6.0, -2.0),
+    'waterproof hiking boots': ('gained', None, None),
+    'cheap sandals': ('lost', 9.0, None),
+    # Matched to a query the old export doesn't have: re-matched there under another one
+    'winter running gloves sale': ('improved', 15.0, 4.0),
+    # Still matches a current row, whose Position is blank: no delta, but not lost
+    'blank position query': ('unchanged', 4.0, None),
+    'blank before query': ('unchanged', None, None),
+    'unknown query here': ('not ranking', None, None),
+}
+
+
+def compared(matched, previous=PREVIOUS):
+    return matched.join(compare_positions(matched, previous))
+
+
+def nan_to_none(values):
+    return [None if pd.isna(value) else value for value in values]
+
+
+def test_change_labels():
+    result = compared(match_queries(fanout(list(CASES)), CURRENT))
+    expected = list(CASES.values())
+    assert result['change'].tolist() == [change for change, _, _ in expected]
+    assert nan_to_none(result['previous_position']) == [previous for _, previous, _ in expected]
+    assert nan_to_none(result['position_delta']) == [delta for _, _, delta in expected]
+
+
+def test_unreached_rows_are_not_evaluated():
+    # A zero budget still resolves exact matches but scores no fuzzy row
+    matched = match_queries(fanout(['running shoes', 'trail running shoes for women']), CURRENT, time_budget=0)
+    result = compared(matched)
+    assert result['change'].tolist() == ['improved', 'not evaluated']
+    assert np.isnan(result['previous_position'].iloc[1])
+
+
+def test_change_counts_cover_every_label():
+    counts = change_counts(compared(match_queries(fanout(list(CASES)), CURRENT)))
+    assert counts == {'gained': 1, 'improved': 2, 'unchanged': 2, 'declined': 1, 'lost': 1,
+                      'not ranking': 1, 'not evaluated': 0}
@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cube import build_cube, slice_cube, slice_records
+
+
+def matched(rows):
+    types, intents, positions, gaps = zip(*rows)
+    return pd.DataFrame({
+        'type': types,
+        'user_intent': intents,
+        'routing_format': ['guide'] * len(rows),
+        'position': positions,
+        'is_gap': gaps,
+        'clicks': [2] * len(rows),
+        'impressions': [20] * len(rows),
+    })
+
+
+# First appearances deliberately out of position order: gap, 50+, 3-10, 1-3
+MATCHED = matched([
+    ('related', 'commercial', None, True),
+    ('related', 'commercial', 60.0, False),
+    ('related', 'informational', 5.0, False),
+    ('comparative', 'informational', 2.0, False),
+    ('comparative', 'informational', 4.0, False),
+    ('comparative', 'commercial', None, True),
+])
+CUBE = build_cube(MATCHED)
+
+
+def test_bucket_columns_come_in_position_order():
+    values = slice_cube(CUBE, 'type', 'bucket')
+    assert values.columns.tolist() == ['1-3', '3-10', '50+', 'gap']
+    assert values.loc['related'].tolist() == [0, 1, 1, 1]
+    assert values.loc['comparative'].tolist() == [1, 1, 0, 1]
+
+
+def test_bucket_rows_come_in_position_order():
+    values = slice_cube(CUBE, 'bucket', measure='clicks')
+    assert values.index.tolist() == ['1-3', '3-10', '50+', 'gap']
+    assert values.tolist() == [2, 4, 2, 4]
+
+
+def test_avg_position_is_nan_where_nothing_ranks():
+    values = slice_cube(CUBE, 'type', 'user_intent', measure='avg_position')
+    assert values.loc['related', 'commercial'] == 60.0
+    assert values.loc['comparative', 'informational'] == 3.0
+    # Only a gap: position_sum / ranking would be 0 / 0
+    assert np.isnan(values.loc['comparative', 'commercial'])
+
+
+def test_filters_keep_only_the_given_labels():
+    values = slice_cube(CUBE, 'type', measure='gaps', filters={'user_intent': ['commercial']})
+    assert values.to_dict() == {'related': 1, 'comparative': 1}
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'rows': 'query'},
+    {'rows': 'type', 'columns': 'position'},
+    {'rows': 'type', 'filters': {'country': ['us']}},
+    {'rows': 'type', 'measure': 'ctr'},
+])
+def test_unknown_names_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        slice_cube(CUBE, **kwargs)
+
+
+def test_slice_records_reads_the_api_cube():
+    records = json.loads(CUBE.to_json(orient='records'))
+    pivot = slice_records(records, 'type', 'user_intent', measure='avg_position')
+    assert pivot == {
+        'rows': ['related', 'comparative'],
+        'columns': ['commercial', 'informational'],
+        'values': [[60.0, 5.0], [None, 3.0]],
+    }
+    json.dumps(pivot)
+    assert slice_records(records, 'bucket') == {
+        'rows': ['1-3', '3-10', '50+', 'gap'], 'columns': None, 'values': [1, 2, 1, 2],
+    }
+
+
+@pytest.mark.parametrize('records, filters', [
+    ({'type': 'related'}, None),
+    ([], {'type': 'related'}),
+])
+def test_slice_records_rejects_malformed_input(records, filters):
+    with pytest.raises(ValueError):
+        slice_records(records, 'type', filters=filters)
@@ -0,0 +1,121 @@
+import threading
+
+import pytest
+
+from jobs import CANCELLED, DONE, FAILED, Job, JobQueue
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(max_workers=1, keep_finished=2)
+    yield queue
+    queue._executor.shutdown(wait=True)
+
+
+def counting(calls, fail=False):
+    def fn(value, progress):
+        calls.append(value)
+        progress('work', 0.5)
+        if fail:
+            raise ValueError('bad csv')
+        return value * 2
+    return fn
+
+
+def test_submit_runs_job(queue):
+    job = queue.submit('a', 'w1', counting([]), 21)
+    job.future.result()
+    assert job.status == DONE
+    assert job.result == 42
+    assert job.progress == 1.0
+    assert 'work' in job.stage_durations
+    assert queue.stats()['completed'] == 1
+
+
+def test_same_key_shares_one_run(queue):
+    calls = []
+    gate = threading.Event()
+    queue.submit('block', 'w0', lambda progress: gate.wait())
+    first = queue.submit('a', 'w1', counting(calls), 1)
+    second = queue.submit('a', 'w2', counting(calls), 1)
+    assert first is second
+    assert first.watchers == {'w1', 'w2'}
+    gate.set()
+    first.future.result()
+    # A finished job is reused too
+    assert queue.submit('a', 'w3', counting(calls), 1) is first
+    assert calls == [1]
+
+
+def test_failed_job_is_kept_until_released(queue):
+    calls = []
+    job = queue.submit('a', 'w1', counting(calls, fail=True), 1)
+    job.future.result()
+    assert job.status == FAILED
+    assert isinstance(job.error, ValueError)
+    # Reruns of the same inputs see the failure instead of running again
+    assert queue.submit('a', 'w1', counting(calls, fail=True), 1) is job
+    assert calls == [1]
+    # Once the inputs change, coming back to them retries
+    queue.release('a', 'w1')
+    retry = queue.submit('a', 'w1', counting(calls, fail=True), 1)
+    retry.future.result()
+    assert retry is not job
+    assert calls == [1, 1]
+
+
+def test_release_cancels_unwatched_queued_job(queue):
+    gate = threading.Event()
+    queue.submit('block', 'w0', lambda progress: gate.wait())
+    calls = []
+    job = queue.submit('a', 'w1', counting(calls), 1)
+    queue.submit('a', 'w2', counting(calls), 1)
+    queue.release('a', 'w1')
+    assert job.status != CANCELLED
+    queue.release('a', 'w2')
+    assert job.status == CANCELLED
+    gate.set()
+    # A cancelled job is restarted by the next submit
+    again = queue.submit('a', 'w1', counting(calls), 1)
+    assert again is not job
+    again.future.result()
+    assert again.status == DONE
+    assert calls == [1]
+
+
+def test_release_cancels_running_job(queue):
+    started, gate = threading.Event(), threading.Event()
+
+    def slow(progress):
+        started.set()
+        gate.wait()
+        progress('work', 0.5)
+
+    job = queue.submit('a', 'w1', slow)
+    started.wait()
+    queue.release('a', 'w1')
+    gate.set()
+    job.future.result()
+    assert job.status == CANCELLED
+    assert queue.stats()['cancelled'] == 1
+
+
+def test_cancel_before_start_finishes_job(queue):
+    # Cancelled once the worker holds the future but before _run checks it
+    calls = []
+    raced = Job('a')
+    raced._cancel.set()
+    queue._run(raced, counting(calls), (1,), {})
+    assert raced.finished
+    assert raced.status == CANCELLED
+    assert calls == []
+    assert queue.stats()['cancelled'] == 1
+
+
+def test_finished_jobs_are_evicted(queue):
+    jobs = [queue.submit(key, 'w', counting([]), 1) for key in 'abc']
+    for job in jobs:
+        job.future.result()
+    queue.submit('d', 'w', counting([]), 1).future.result()
+    assert queue.get('a') is None
+    assert queue.get('d') is not None
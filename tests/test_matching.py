@@ -0,0 +1,171 @@
+"""Matcher parity: both backends against a port of the original in-browser matcher."""
+import io
+import random
+
+import pandas as pd
+import pytest
+
+from matching import MATCHED_COLUMNS, match_queries
+
+FANOUT_FIELDS = {'type': 'related', 'user_intent': 'informational', 'routing_format': 'guide'}
+
+
+def reference_match(fanout_query, gsc_queries):
+    """Index of the GSC row the original page's matchQueries() picked, or None.
+
+    Straight loop over every GSC row: exact = 100, otherwise fan-out words of 3+
+    characters found in the GSC query (counted per repeat) over the longer word
+    count; similarity > 0.7 and length difference < 20 score similarity x 90;
+    a row only replaces the best on a strictly higher score above 50.
+    """
+    fanout_query = fanout_query.lower().strip()
+    fanout_words = fanout_query.split(' ')
+    best, best_score = None, 0
+    for idx, gsc_query in enumerate(gsc_queries):
+        gsc_query = gsc_query.lower().strip()
+        score = 0
+        if gsc_query == fanout_query:
+            score = 100
+        else:
+            gsc_words = gsc_query.split(' ')
+            matching = sum(1 for word in fanout_words if len(word) > 2 and word in gsc_words)
+            similarity = matching / max(len(fanout_words), len(gsc_words))
+            if similarity > 0.7 and abs(len(fanout_query) - len(gsc_query)) < 20:
+                score = similarity * 90
+        if score > best_score and score > 50:
+            best, best_score = idx, score
+    return best
+
+
+def _frames(fanout_queries, gsc_queries):
+    fanout = pd.DataFrame({'query': fanout_queries, **{k: [v] * len(fanout_queries) for k, v in FANOUT_FIELDS.items()}})
+    gsc = pd.DataFrame({
+        'Top queries': gsc_queries,
+        'Clicks': range(len(gsc_queries)),
+        'Impressions': [10 * i for i in range(len(gsc_queries))],
+        'CTR': ['1%'] * len(gsc_queries),
+        # Position doubles as the row number, so a result says which row matched
+        'Position': [float(i + 1) for i in range(len(gsc_queries))],
+    })
+    return fanout, gsc
+
+
+def _csv(df):
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+
+def match_pandas(fanout, gsc):
+    return match_queries(pd.read_csv(io.BytesIO(_csv(fanout))), pd.read_csv(io.BytesIO(_csv(gsc))))
+
+
+def match_polars(fanout, gsc):
+    polars_backend = pytest.importorskip('polars_backend')
+    matched, _, _ = polars_backend.match_and_aggregate(_csv(fanout), _csv(gsc))
+    return matched
+
+
+BACKENDS = {'pandas': match_pandas, 'polars': match_polars}
+
+
+def matched_rows(backend, fanout_queries, gsc_queries):
+    # GSC row index per fan-out query (None for gaps)
+    if backend == 'polars':
+        pytest.importorskip('polars')
+    matched = BACKENDS[backend](*_frames(fanout_queries, gsc_queries))
+    assert list(matched.columns) == MATCHED_COLUMNS
+    return [None if gap else int(position) - 1 for gap, position in zip(matched['is_gap'], matched['position'])]
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def backend(request):
+    return request.param
+
+
+def test_exact_match_wins_and_earliest_exact_row_is_kept(backend):
+    gsc = ['running shoes sale', 'Running Shoes', 'running shoes ']
+    assert matched_rows(backend, ['running shoes'], gsc) == [1]
+
+
+def test_exact_beats_earlier_fuzzy_match(backend):
+    gsc = ['best trail running shoes men', 'best trail running shoes']
+    assert matched_rows(backend, ['best trail running shoes'], gsc) == [1]
+
+
+def test_similarity_must_exceed_threshold(backend):
+    # 3 of 4 words: 0.75 matches; 7 of 10 words: exactly 0.7 does not
+    four = 'alpha bravo charlie delta'
+    ten = 'alpha bravo charlie delta echoes foxtrot golfs hotel india juliet'
+    gsc = ['alpha bravo charlie zulus', 'alpha bravo charlie delta echoes foxtrot golfs xrays yanks zulus']
+    assert matched_rows(backend, [four, ten], gsc) == [0, None]
+
+
+def test_length_difference_must_stay_under_limit(backend):
+    # Same 3-of-4 similarity; only the padding word's length changes the length difference
+    fanout = 'alpha bravo charlie delta'
+    assert matched_rows(backend, [fanout], ['alpha bravo charlie ' + 'x' * 24]) == [0]   # difference 19
+    assert matched_rows(backend, [fanout], ['alpha bravo charlie ' + 'x' * 25]) == [None]  # difference 20
+
+
+def test_score_is_similarity_times_weight_above_minimum(backend):
+    # The best of several passing rows is the highest similarity x 90 (4/4 > 3/4 words)
+    gsc = ['alpha bravo charlie zulus', 'alpha bravo charlie delta extra']
+    assert matched_rows(backend, ['delta alpha bravo charlie'], gsc) == [1]
+
+
+def test_short_words_do_not_count(backend):
+    # "of"/"to" are ignored, so 2 of 4 words can never pass
+    assert matched_rows(backend, ['best of to shoes'], ['best ab cd shoes']) == [None]
+
+
+def test_ties_keep_the_earliest_gsc_row(backend):
+    gsc = ['alpha bravo charlie yanks', 'alpha bravo charlie zulus', 'alpha bravo charlie xrays']
+    assert matched_rows(backend, ['alpha bravo charlie delta'], gsc) == [0]
+
+
+def test_repeated_fanout_words_count_per_repeat(backend):
+    # "alpha" twice counts twice: 3/4 words matched
+    assert matched_rows(backend, ['alpha alpha bravo delta'], ['alpha bravo charlie echo']) == [0]
+
+
+def random_queries(seed):
+    rng = random.Random(seed)
+    vocabulary = ['shoes', 'running', 'trail', 'best', 'cheap', 'women', 'men', 'wide', 'to', 'of', 'vs',
+                  'review', 'waterproof', 'nike', 'size', 'guide', 'how', 'for']
+
+    def query():
+        return ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(1, 7)))
+
+    gsc = [query() for _ in range(400)]
+    # Mix in exact repeats (with case/space noise) and near variants of GSC queries
+    fanout = [query() for _ in range(300)]
+    fanout += [rng.choice(gsc).upper() + ' ' for _ in range(50)]
+    fanout += [rng.choice(gsc) + ' ' + rng.choice(vocabulary) for _ in range(150)]
+    return fanout, gsc
+
+
+def test_random_inputs_match_reference(backend):
+    fanout, gsc = random_queries(7)
+    assert matched_rows(backend, fanout, gsc) == [reference_match(q, gsc) for q in fanout]
+
+
+def test_polars_blocks_match_reference(monkeypatch):
+    # Tiny blocks: cut on candidate pairs as well as on rows
+    polars_backend = pytest.importorskip('polars_backend')
+    monkeypatch.setattr(polars_backend, 'MAX_BLOCK_PAIRS', 500)
+    monkeypatch.setattr(polars_backend, 'FUZZY_BLOCK_ROWS', 7)
+    fanout, gsc = random_queries(11)
+    assert matched_rows('polars', fanout, gsc) == [reference_match(q, gsc) for q in fanout]
+
+
+def test_blank_counts_come_back_as_zero(backend):
+    if backend == 'polars':
+        pytest.importorskip('polars')
+    fanout, gsc = _frames(['alpha bravo', 'charlie delta'], ['alpha bravo', 'charlie delta'])
+    gsc['Clicks'] = gsc['Clicks'].astype(object)
+    gsc.loc[0, 'Clicks'] = None
+    gsc.loc[1, 'Impressions'] = None
+    matched = BACKENDS[backend](fanout, gsc)
+    assert matched['clicks'].tolist() == [0, 1]
+    assert matched['impressions'].tolist() == [0, 0]
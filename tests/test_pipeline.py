@@ -0,0 +1,38 @@
+import io
+
+import pandas as pd
+
+import pipeline
+
+
+def csv_bytes(df):
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+
+FANOUT = csv_bytes(pd.DataFrame({
+    'query': ['running shoes', 'trail running shoes women', 'waterproof boots'],
+    'type': ['related', 'implicit', 'comparative'],
+    'user_intent': ['commercial'] * 3,
+    'routing_format': ['guide'] * 3,
+}))
+GSC = csv_bytes(pd.DataFrame({
+    'Top queries': ['running shoes', 'trail running shoes for women'],
+    'Clicks': [10, 4],
+    'Impressions': [100, 80],
+    'CTR': ['10%', '5%'],
+    'Position': [2.5, 7.0],
+}))
+
+
+def test_polars_backend_falls_back_without_polars(monkeypatch):
+    monkeypatch.setattr(pipeline, 'POLARS_AVAILABLE', False)
+
+    def unavailable(*args, **kwargs):
+        raise AssertionError('polars backend used without polars')
+
+    monkeypatch.setattr(pipeline, 'run_analysis_polars', unavailable)
+    result = pipeline.build_analysis(FANOUT, GSC, backend='polars')
+    assert result['matched']['is_gap'].tolist() == [False, False, True]
+
@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+import tiles
+from matching import match_queries
+
+
+@pytest.fixture
+def tile_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(tiles, 'TILE_ROOT', tmp_path)
+    return tmp_path
+
+
+@pytest.fixture(scope='module')
+def matched():
+    fanout = pd.DataFrame({
+        'query': [f'running shoes {i}' for i in range(40)] + ['waterproof boots'],
+        'type': ['related', 'implicit'] * 20 + ['comparative'],
+        'user_intent': ['commercial'] * 41,
+        'routing_format': ['guide', 'listicle', 'faq', 'video'] * 10 + ['guide'],
+    })
+    gsc = pd.DataFrame({
+        'Top queries': [f'running shoes {i}' for i in range(40)],
+        'Clicks': range(40),
+        'Impressions': range(100, 140),
+        'CTR': ['1%'] * 40,
+        'Position': [1 + i * 1.5 for i in range(40)],
+    })
+    return match_queries(fanout, gsc)
+
+
+def test_concurrent_builds_share_one_set(tile_root, matched):
+    manifests, errors = [], []
+
+    def build():
+        try:
+            manifests.append(tiles.build_tiles('k1', matched, '/tiles'))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=build) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert all(manifest == manifests[0] for manifest in manifests)
+    assert manifests[0]['row_count'] == len(matched)
+    assert [p.name for p in tile_root.iterdir()] == ['k1']
+    assert json.loads((tile_root / 'k1' / 'manifest.json').read_text()) == manifests[0]
+
+
+def test_interrupted_build_is_replaced(tile_root, matched):
+    (tile_root / 'k1' / '0').mkdir(parents=True)
+    manifest = tiles.build_tiles('k1', matched, '/tiles')
+    assert (tile_root / 'k1' / 'manifest.json').exists()
+    assert manifest['base'] == '/tiles/k1'
+
+
+def test_prune_keeps_sets_in_use(tile_root, matched, monkeypatch):
+    monkeypatch.setattr(tiles, 'KEEP_TILE_SETS', 3)
+    for age, key in enumerate(['old', 'mid', 'new']):
+        tiles.build_tiles(key, matched, '/tiles')
+        stamp = 1_000_000 + age
+        os.utime(tile_root / key / 'manifest.json', (stamp, stamp))
+        os.utime(tile_root / key, (stamp, stamp))
+    # Browsing the oldest set again makes it the most recently used
+    tiles.build_tiles('old', matched, '/tiles')
+    tiles.build_tiles('newest', matched, '/tiles')
+    assert sorted(p.name for p in tile_root.iterdir()) == ['new', 'newest', 'old']
@@ -0,0 +1,248 @@
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+TILE_ROOT = Path(__file__).parent / 'static' / 'tiles'
+TILE_SIZE = 256
+ROW_PX = 8
+COL_PX = 32
+MIN_COL_PX = 2
+OVERVIEW_HEIGHT = 1024
+CHUNK_ROWS = 1000
+ROW_FIELDS = ['fanout_query', 'type', 'routing_format', 'position', 'clicks', 'impressions', 'is_gap']
+KEEP_TILE_SETS = 8
+
+# One build per key at a time in this process
+_locks = {}
+_locks_guard = threading.Lock()
+
+# Same buckets and colours as getPositionColor() in the page; gaps sort after every position
+THRESHOLDS = np.array([3, 5, 10, 15, 20, 30, 50])
+PALETTE_HEX = [
+    '#10b981', '#84cc16', '#facc15', '#fbbf24', '#fb923c', '#f97316', '#ef4444', '#dc2626',
+    '#374151',  # content gap
+    '#64748b',  # not evaluated (matching time budget ran out)
+    '#1e2838',  # inactive type/format cell (#1f2937 at 20% over the card)
+    '#1e293b',  # card background / separators
+]
+GAP = 8
+NOT_EVALUATED = 9
+INACTIVE = 10
+BACKGROUND = 11
+PALETTE = np.array([[int(h[i:i + 2], 16) for i in (1, 3, 5)] for h in PALETTE_HEX], dtype=np.uint8)
+
+
+def encode_png(indices, palette=PALETTE):
+    # Minimal indexed-colour PNG writer: the bucket palette is the PLTE chunk, so tiles
+    # are written straight from bucket indices. The "Up" filter turns repeated
+    # scanlines (every cell spans several) into zero runs that compress to nothing.
+    height, width = indices.shape
+    raw = np.empty((height, width + 1), dtype=np.uint8)
+    raw[:, 0] = 2
+    raw[0, 1:] = indices[0]
+    raw[1:, 1:] = indices[1:] - indices[:-1]
+
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body) & 0xFFFFFFFF)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'PLTE', palette.tobytes())
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)) + chunk(b'IEND', b''))
+
+
+def _label_values(series):
+    return np.array([value if isinstance(value, str) else '' for value in series.tolist()], dtype=str)
+
+
+def _labels(series):
+    return sorted(set(_label_values(series).tolist()))
+
+
+def bucket_grid(matched_df):
+    """Colour-bucket index per (row, column) for the main, type and format heatmaps side by side."""
+    position = matched_df['position'].astype(float).to_numpy()
+    gap = matched_df['is_gap'].astype(bool).to_numpy() | np.isnan(position)
+    bucket = np.searchsorted(THRESHOLDS, np.nan_to_num(position), side='left').astype(np.uint8)
+    bucket[gap] = GAP
+    if 'evaluated' in matched_df:
+        bucket[~matched_df['evaluated'].astype(bool).to_numpy()] = NOT_EVALUATED
+
+    types = _labels(matched_df['type'])
+    formats = _labels(matched_df['routing_format'])
+    type_idx = np.searchsorted(np.array(types, dtype=str), _label_values(matched_df['type']))
+    format_idx = np.searchsorted(np.array(formats, dtype=str), _label_values(matched_df['routing_format']))
+
+    # Layout: [main] [sep] [types...] [sep] [formats...]
+    columns = [{'label': 'Position', 'group': 'main'}, None]
+    columns += [{'label': t, 'group': 'type'} for t in types] + [None]
+    columns += [{'label': f, 'group': 'format'} for f in formats]
+    type_start = 2
+    format_start = type_start + len(types) + 1
+
+    rows = len(matched_df)
+    grid = np.full((rows, len(columns)), INACTIVE, dtype=np.uint8)
+    grid[:, 1] = BACKGROUND
+    grid[:, format_start - 1] = BACKGROUND
+    grid[:, 0] = bucket
+    row_ids = np.arange(rows)
+    grid[row_ids, type_start + type_idx] = bucket
+    grid[row_ids, format_start + format_idx] = bucket
+    return grid, columns
+
+
+def _pool_rows(grid, factor):
+    # Worst bucket per block of rows, so gaps stay visible when zoomed out
+    rows = grid.shape[0]
+    pad = (-rows) % factor
+    if pad:
+        grid = np.vstack([grid, np.full((pad, grid.shape[1]), BACKGROUND, dtype=grid.dtype)])
+    pooled = grid.reshape(-1, factor, grid.shape[1])
+    # Background/inactive indices are larger than gap; only let them win when the block has nothing else
+    ranked = np.where(pooled >= INACTIVE, -1, pooled.astype(np.int16))
+    best = ranked.max(axis=1)
+    return np.where(best < 0, pooled[:, 0, :], best).astype(np.uint8)
+
+
+def _levels(rows, cols):
+    # Highest zoom draws ROW_PX x COL_PX per cell; each level down halves both.
+    # Below one pixel per row, rows are pooled instead.
+    levels = []
+    scale = 1
+    while True:
+        row_px = max(1, ROW_PX // scale)
+        rows_per_px = max(1, scale // ROW_PX)
+        col_px = max(MIN_COL_PX, COL_PX // scale)
+        height = -(-rows // rows_per_px) * row_px
+        levels.append({
+            'row_px': row_px,
+            'rows_per_px': rows_per_px,
+            'col_px': col_px,
+            'width': cols * col_px,
+            'height': height,
+        })
+        if height <= OVERVIEW_HEIGHT:
+            break
+        scale *= 2
+    levels.reverse()
+    for z, level in enumerate(levels):
+        level['z'] = z
+    return levels
+
+
+def _write_level(grid, level, directory):
+    pooled = _pool_rows(grid, level['rows_per_px']) if level['rows_per_px'] > 1 else grid
+    row_px, col_px = level['row_px'], level['col_px']
+    # Powers of two: every tile covers a whole number of cells
+    tile_rows, tile_cols = TILE_SIZE // row_px, TILE_SIZE // col_px
+    directory.mkdir(parents=True, exist_ok=True)
+    for ty in range(-(-pooled.shape[0] // tile_rows)):
+        for tx in range(-(-pooled.shape[1] // tile_cols)):
+            cells = np.full((tile_rows, tile_cols), BACKGROUND, dtype=np.uint8)
+            part = pooled[ty * tile_rows:(ty + 1) * tile_rows, tx * tile_cols:(tx + 1) * tile_cols]
+            cells[:part.shape[0], :part.shape[1]] = part
+            # Array fills only: repeat cells into pixels; colours come from the PNG palette
+            pixels = np.repeat(np.repeat(cells, row_px, axis=0), col_px, axis=1)
+            (directory / f'{tx}_{ty}.png').write_bytes(encode_png(pixels))
+
+
+def _row_fields(matched_df):
+    # Budgeted runs also say which rows matching never reached
+    return ROW_FIELDS + ['evaluated'] if 'evaluated' in matched_df else ROW_FIELDS
+
+
+def _write_row_index(matched_df, directory):
+    # Tooltip data, fetched by the viewer one chunk at a time
+    directory.mkdir(parents=True, exist_ok=True)
+    table = matched_df[_row_fields(matched_df)]
+    for start in range(0, len(table), CHUNK_ROWS):
+        part = table.iloc[start:start + CHUNK_ROWS]
+        (directory / f'{start // CHUNK_ROWS}.json').write_text(part.to_json(orient='values'), encoding='utf-8')
+
+
+def build_tiles(key, matched_df, url_base):
+    """Render tile pyramids for a matched table under static/tiles/<key>; returns the manifest.
+
+    Tile sets are content-addressed by the analysis key, so an existing set is reused
+    (and its manifest touched, so pruning keeps sets that are still being browsed).
+    Sessions sharing a key build it once: builds take a per-key lock and stage into
+    their own directory, so a build in another process can't clobber it either.
+    """
+    with _key_lock(key):
+        manifest = _reuse(key)
+        if manifest is not None:
+            return manifest
+
+        grid, columns = bucket_grid(matched_df)
+        levels = _levels(*grid.shape)
+        TILE_ROOT.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(dir=TILE_ROOT, prefix=f'.{key}.', suffix='.tmp'))
+        try:
+            for level in levels:
+                _write_level(grid, level, staging / str(level['z']))
+            _write_row_index(matched_df, staging / 'rows')
+
+            manifest = {
+                'base': f'{url_base}/{key}',
+                'tile_size': TILE_SIZE,
+                'levels': levels,
+                'columns': columns,
+                'row_count': len(matched_df),
+                'chunk_rows': CHUNK_ROWS,
+                'row_fields': _row_fields(matched_df),
+            }
+            (staging / 'manifest.json').write_text(json.dumps(manifest), encoding='utf-8')
+            target = TILE_ROOT / key
+            if target.exists() and not (target / 'manifest.json').exists():
+                # Left over from an interrupted build before staging was in place
+                shutil.rmtree(target, ignore_errors=True)
+            try:
+                staging.rename(target)
+            except OSError:
+                # Another process finished the same set first; use that one
+                finished = _reuse(key)
+                if finished is None:
+                    raise
+                return finished
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    _prune()
+    return manifest
+
+
+def _key_lock(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _reuse(key):
+    manifest_path = TILE_ROOT / key / 'manifest.json'
+    try:
+        os.utime(manifest_path)
+        return json.loads(manifest_path.read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return None
+
+
+def _last_used(path):
+    try:
+        return (path / 'manifest.json').stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def _prune():
+    sets = sorted(
+        (p for p in TILE_ROOT.iterdir() if p.is_dir() and not p.name.startswith('.')),
+        key=_last_used,
+        reverse=True,
+    )
+    for stale in sets[KEEP_TILE_SETS:]:
+        shutil.rmtree(stale, ignore_errors=True)
@@ -0,0 +1,244 @@
+"""Watch-folder service: re-runs the analysis whenever a client's exports change.
+
+Layout: every directory under the watched root that holds CSVs is one client.
+The newest fan-out file (has a "query" column) and the newest GSC Queries file
+(has a "Top queries" column) in it form that client's inputs.
+
+    python watcher.py exports/ --workers 2 --cluster 0.6
+
+State, results and the run log live in <root>/.fanout-watch (or --output), so a
+restart only runs clients whose inputs changed since their last finished run.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from jobs import DONE, FAILED, JobQueue
+
+STATE_DIR = '.fanout-watch'
+POLL_SECONDS = 5.0
+# A file must keep the same size and mtime this long before it is read
+SETTLE_SECONDS = 10.0
+# Names export tools use while still writing
+PARTIAL_SUFFIXES = ('.part', '.partial', '.tmp', '.crdownload', '.download', '~')
+
+log = logging.getLogger('fanout-watch')
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def file_kind(path):
+    # Classify by header row only; anything unrecognised is ignored
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            header = next(csv.reader(f), [])
+    except (OSError, UnicodeDecodeError, csv.Error):
+        return None
+    if 'Top queries' in header:
+        return 'gsc'
+    if 'query' in header:
+        return 'fanout'
+    return None
+
+
+def run_key(fanout_hash, gsc_hash, cluster_threshold):
+    digest = hashlib.sha256()
+    for part in (fanout_hash, gsc_hash, repr(cluster_threshold)):
+        digest.update(part.encode())
+    return digest.hexdigest()
+
+
+def process_client(client, fanout_path, gsc_path, out_dir, cluster_threshold=None, progress=None):
+    # Runs on a worker thread; results go to a fresh folder that is renamed into place
+    import pipeline
+    from report import build_report
+
+    fanout_bytes = Path(fanout_path).read_bytes()
+    gsc_bytes = Path(gsc_path).read_bytes()
+    analysis = pipeline.build_analysis(fanout_bytes, gsc_bytes, cluster_threshold, progress=progress)
+
+    out_dir = Path(out_dir)
+    staging = out_dir.with_name(f'.{out_dir.name}.tmp')
+    staging.mkdir(parents=True, exist_ok=True)
+    pipeline.export_table(analysis).to_csv(staging / 'matched_queries.csv', index=False)
+    (staging / 'report.html').write_text(build_report(analysis, title=f'{client} - Query Fan-Out Report'),
+                                         encoding='utf-8')
+    (staging / 'coverage.json').write_text(json.dumps(analysis['coverage'], indent=2), encoding='utf-8')
+    staging.replace(out_dir)
+
+    matched = analysis['matched']
+    return {'rows': len(matched), 'gaps': int(matched['is_gap'].sum())}
+
+
+class WatchService:
+    def __init__(self, root, output=None, workers=2, cluster_threshold=None,
+                 settle=SETTLE_SECONDS, poll=POLL_SECONDS):
+        self.root = Path(root).resolve()
+        self.output = Path(output).resolve() if output else self.root / STATE_DIR
+        self.cluster_threshold = cluster_threshold
+        self.settle = settle
+        self.poll = poll
+        self.queue = JobQueue(max_workers=workers)
+        self.state_path = self.output / 'state.json'
+        self.log_path = self.output / 'runs.jsonl'
+        self.state = self._load_state()
+        # path -> (size, mtime_ns, first seen with that signature)
+        self._seen = {}
+        # path -> (size, mtime_ns, sha256); avoids re-hashing unchanged files every poll
+        self._hashes = {}
+        # client -> (key, inputs, output dir) of the run in flight
+        self._running = {}
+
+    def _load_state(self):
+        try:
+            return json.loads(self.state_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        self.output.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.state, indent=2), encoding='utf-8')
+        tmp.replace(self.state_path)
+
+    def _log_run(self, entry):
+        self.output.mkdir(parents=True, exist_ok=True)
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    def _stable(self, path, stat, now):
+        # Debounce: only files whose size and mtime have not moved for `settle` seconds
+        signature = (stat.st_size, stat.st_mtime_ns)
+        seen = self._seen.get(path)
+        if seen is None or seen[:2] != signature:
+            self._seen[path] = signature + (now,)
+            return False
+        return stat.st_size > 0 and now - seen[2] >= self.settle
+
+    def _hash(self, path, stat):
+        cached = self._hashes.get(path)
+        if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self._hashes[path] = (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+        return self._hashes[path][2]
+
+    def scan(self, now=None):
+        """Inputs per client: {client: {'fanout': (path, hash), 'gsc': (path, hash)}}.
+
+        Clients with a file still being written are left out until it settles.
+        """
+        now = time.time() if now is None else now
+        clients = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirpath = Path(dirpath)
+            dirnames[:] = [d for d in dirnames if not d.startswith('.') and dirpath / d != self.output]
+            candidates = {}
+            unsettled = False
+            for name in filenames:
+                if name.startswith('.') or name.endswith(PARTIAL_SUFFIXES):
+                    continue
+                if not name.lower().endswith('.csv'):
+                    continue
+                path = dirpath / name
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                if not self._stable(str(path), stat, now):
+                    unsettled = True
+                    continue
+                kind = file_kind(path)
+                if kind is None:
+                    continue
+                newest = candidates.get(kind)
+                if newest is None or stat.st_mtime_ns > newest[1].st_mtime_ns:
+                    candidates[kind] = (path, stat)
+            if unsettled or len(candidates) < 2:
+                continue
+            client = dirpath.relative_to(self.root).as_posix()
+            clients[client] = {
+                kind: (str(path), self._hash(str(path), stat)) for kind, (path, stat) in candidates.items()
+            }
+        return clients
+
+    def tick(self, now=None):
+        # One poll: collect finished runs, then start runs for clients whose inputs changed
+        self._collect()
+        for client, inputs in sorted(self.scan(now).items()):
+            key = run_key(inputs['fanout'][1], inputs['gsc'][1], self.cluster_threshold)
+            if self.state.get(client, {}).get('key') == key or client in self._running:
+                continue
+            out_dir = self.output / 'results' / client / f"{datetime.now():%Y%m%d-%H%M%S}-{key[:8]}"
+            log.info('%s: inputs changed, queueing run %s', client, key[:12])
+            # Queue keys include the client: identical files in two folders still get their own results
+            job = self.queue.submit(f'{client}:{key}', client, process_client, client, inputs['fanout'][0],
+                                    inputs['gsc'][0], str(out_dir), self.cluster_threshold)
+            # Keep the Job itself: the queue only remembers a few finished jobs by key
+            self._running[client] = (job, key, inputs, str(out_dir))
+
+    def _collect(self):
+        for client, (job, key, inputs, out_dir) in list(self._running.items()):
+            if not job.finished:
+                continue
+            del self._running[client]
+            entry = {
+                'time': _now(),
+                'client': client,
+                'key': key,
+                'status': job.status,
+                'seconds': round(job.duration or 0.0, 2),
+                'fanout': inputs['fanout'][0],
+                'gsc': inputs['gsc'][0],
+            }
+            if job.status == DONE:
+                entry.update(job.result, output=out_dir)
+                log.info('%s: done in %.1fs (%d rows) -> %s', client, entry['seconds'], entry['rows'], out_dir)
+            else:
+                entry['error'] = repr(job.error) if job.status == FAILED else None
+                log.warning('%s: run %s %s', client, job.status, entry['error'] or '')
+            self._log_run(entry)
+            # Failed runs are recorded too, so the same broken inputs are not retried on every poll
+            self.state[client] = {k: entry[k] for k in ('key', 'status', 'time')}
+            if job.status == DONE:
+                self.state[client]['output'] = out_dir
+            self._save_state()
+
+    def run(self):
+        log.info('watching %s (results in %s)', self.root, self.output)
+        while True:
+            self.tick()
+            time.sleep(self.poll)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Watch per-client export folders and run the fan-out analysis')
+    parser.add_argument('root', help='Directory tree with one sub-folder per client')
+    parser.add_argument('--output', help=f'State, results and run log (default: <root>/{STATE_DIR})')
+    parser.add_argument('--workers', type=int, default=2, help='Concurrent analysis runs')
+    parser.add_argument('--cluster', type=float, default=None, help='Cluster threshold; omit to disable clustering')
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS, help='Seconds a file must stay unchanged')
+    parser.add_argument('--poll', type=float, default=POLL_SECONDS, help='Seconds between scans')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    service = WatchService(args.root, args.output, args.workers, args.cluster, args.settle, args.poll)
+    try:
+        service.run()
+    except KeyboardInterrupt:
+        log.info('stopped')
+
+
+if __name__ == '__main__':
+    main()